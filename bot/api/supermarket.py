@@ -1,72 +1,452 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import Awaitable, Callable
+from datetime import date
 from typing import Any
 
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-
-from config.settings import SUPER_API_BASE, SUPER_API_KEY
-
-# Setup a global session with retries for resilience
-session = requests.Session()
-retries = Retry(
-    total=3,
-    backoff_factor=1,
-    status_forcelist=[
-        500,
-        502,
-        503,
-        504,
-    ],  # Fixed from status_for_list to status_forcelist
+import httpx
+
+from config.settings import (
+    SUPER_API_BASE,
+    SUPER_API_BURST,
+    SUPER_API_DAILY_QUOTA,
+    SUPER_API_KEY,
+    SUPER_API_MAX_CONNECTIONS,
+    SUPER_API_RATE,
+    SUPER_API_TIMEOUT,
 )
-session.mount("https://", HTTPAdapter(max_retries=retries))
 
+PRODUCTS_URL = f"{SUPER_API_BASE}/products"
+CATEGORIES_URL = f"{SUPER_API_BASE}/categories"
+HEADERS = {"Authorization": f"Bearer {SUPER_API_KEY}"}
+
+# Same retry policy the old requests/urllib3 session used
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 1
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Longest Retry-After we are willing to sleep; beyond that the call fails
+MAX_RETRY_AFTER = SUPER_API_TIMEOUT
+
+# Limiter lanes: lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_BULK = 2
+
+# Share of the daily quota each lane may use, so background work can never
+# starve interactive searches of the last requests of the day
+QUOTA_SHARES = {
+    PRIORITY_INTERACTIVE: 1.0,
+    PRIORITY_BACKGROUND: 0.9,
+    PRIORITY_BULK: 0.7,
+}
+
+LIMITS = httpx.Limits(
+    max_connections=SUPER_API_MAX_CONNECTIONS,
+    max_keepalive_connections=SUPER_API_MAX_CONNECTIONS,
+)
+TIMEOUT = httpx.Timeout(SUPER_API_TIMEOUT, connect=5.0)
+
+
+class QuotaExceededError(Exception):
+    """Raised when a lane has used up its share of the daily API quota."""
+
+
+class TokenBucketLimiter:
+    """
+    Async token bucket shared by every API caller.
+    Waiters are served by priority lane first and FIFO within a lane.
+    """
+
+    def __init__(self, rate: float, burst: int, daily_quota: int = 0):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.daily_quota = daily_quota
+        self.stats = {"granted": 0, "waited": 0, "rejected": 0}
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._waiters: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+        self._day = date.today()
+        self._used_today = 0
+
+    @property
+    def used_today(self) -> int:
+        return self._used_today
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _check_quota(self, priority: int) -> None:
+        today = date.today()
+        if today != self._day:
+            self._day, self._used_today = today, 0
+        if not self.daily_quota:
+            return
+        if self._used_today >= self.daily_quota * QUOTA_SHARES.get(priority, 1.0):
+            self.stats["rejected"] += 1
+            raise QuotaExceededError(
+                f"Daily API quota reached for lane {priority} "
+                f"({self._used_today}/{self.daily_quota})"
+            )
+
+    def _grant(self) -> None:
+        self._tokens -= 1
+        self._used_today += 1
+        self.stats["granted"] += 1
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> None:
+        """Waits for a token in the given lane. Raises QuotaExceededError."""
+        async with self._cond:
+            self._check_quota(priority)
+            if self.rate <= 0:
+                self._grant()
+                return
+
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiters, entry)
+            waited = False
+            try:
+                while True:
+                    self._refill()
+                    delay = None
+                    if self._waiters[0] == entry:
+                        if self._tokens >= 1:
+                            self._check_quota(priority)
+                            heapq.heappop(self._waiters)
+                            self._grant()
+                            self.stats["waited"] += waited
+                            self._cond.notify_all()
+                            return
+                        delay = (1 - self._tokens) / self.rate
+
+                    waited = True
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), delay)
+                    except TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    def consume_nowait(self, priority: int = PRIORITY_INTERACTIVE) -> None:
+        """Books a request made outside the event loop (sync shim)."""
+        self._check_quota(priority)
+        self._refill()
+        self._grant()
+
+
+limiter = TokenBucketLimiter(SUPER_API_RATE, SUPER_API_BURST, SUPER_API_DAILY_QUOTA)
+
+# Single-flight bookkeeping: one shared fetch per (normalized query, lane)
+_inflight: dict[tuple[str, int], asyncio.Task] = {}
+API_STATS = {"calls": 0, "fetches": 0, "coalesced": 0}
+
+# Clients are created lazily so the async one binds to the bot's running loop
+_async_client: httpx.AsyncClient | None = None
+_sync_client: httpx.Client | None = None
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            http2=True, limits=LIMITS, timeout=TIMEOUT, headers=HEADERS
+        )
+    return _async_client
+
+
+def _get_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(
+            http2=True, limits=LIMITS, timeout=TIMEOUT, headers=HEADERS
+        )
+    return _sync_client
+
+
+async def close_clients() -> None:
+    """Closes pooled connections. Called on application shutdown."""
+    if _async_client is not None and not _async_client.is_closed:
+        await _async_client.aclose()
+    if _sync_client is not None and not _sync_client.is_closed:
+        _sync_client.close()
+
+
+def _backoff(attempt: int) -> float:
+    return BACKOFF_FACTOR * (2**attempt)
+
+
+def _should_retry(response: httpx.Response | None, attempt: int) -> bool:
+    if attempt >= MAX_RETRIES:
+        return False
+    return response is None or response.status_code in RETRY_STATUSES
+
+
+def _retry_delay(response: httpx.Response | None, attempt: int) -> float | None:
+    """
+    Honours Retry-After on 429/503, otherwise exponential backoff.
+    Returns None when the server asks us to wait longer than MAX_RETRY_AFTER.
+    """
+    retry_after = response.headers.get("Retry-After") if response else None
+    if retry_after and retry_after.isdigit():
+        delay = float(retry_after)
+        return delay if delay <= MAX_RETRY_AFTER else None
+    return _backoff(attempt)
+
+
+async def _get_async(
+    url: str,
+    params: dict | None = None,
+    timeout: float | None = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> httpx.Response:
+    """
+    GET with retries on transport errors, 429 and 5xx responses.
+    Every attempt, retries included, takes a token from the shared limiter.
+    """
+    client = _get_async_client()
+    call_timeout = timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.acquire(priority)
+        response = None
+        try:
+            response = await client.get(url, params=params, timeout=call_timeout)
+        except httpx.TransportError:
+            if not _should_retry(None, attempt):
+                raise
+        if response is not None and not _should_retry(response, attempt):
+            response.raise_for_status()
+            return response
+        delay = _retry_delay(response, attempt)
+        if delay is None:
+            response.raise_for_status()
+        await asyncio.sleep(delay)
 
-def get_product_price(
-    product_name: str, multiple: bool = False
+
+def _get_sync(
+    url: str, params: dict | None = None, timeout: float | None = None
+) -> httpx.Response:
+    """Blocking twin of `_get_async` for callers that are not async yet."""
+    client = _get_sync_client()
+    call_timeout = timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.consume_nowait()
+        response = None
+        try:
+            response = client.get(url, params=params, timeout=call_timeout)
+        except httpx.TransportError:
+            if not _should_retry(None, attempt):
+                raise
+        if response is not None and not _should_retry(response, attempt):
+            response.raise_for_status()
+            return response
+        delay = _retry_delay(response, attempt)
+        if delay is None:
+            response.raise_for_status()
+        time.sleep(delay)
+
+
+def _parse_products(json_response: dict) -> list[dict[str, Any]]:
+    """Maps the API response to the internal product structure."""
+    results = []
+    for p in json_response.get("data", []):
+        product_info = {
+            "id": p.get("id"),
+            "name": p.get("name", "Unknown Product"),
+            "price": p.get("price_lev", 0.0),
+            "price_eur": p.get("price_eur", 0.0),
+            "unit": p.get("quantity", "n/a"),
+            "quantity": p.get("quantity"),
+            "store": p.get("supermarket", {}).get("name", "Unknown Store"),
+            "supermarket": p.get("supermarket"),
+            "image": p.get("image_url"),
+            "image_url": p.get("image_url"),
+            "discount": p.get("discount"),
+            "brochure": p.get("brochure"),
+        }
+        results.append(product_info)
+    return results
+
+
+def _shape(
+    results: list[dict[str, Any]], multiple: bool
+) -> dict[str, Any] | None | list[dict[str, Any]]:
+    if multiple:
+        return results
+    return results[0] if results else None
+
+
+def _search_params(product_name: str) -> dict:
+    # Increased limit from 5 to 10 to provide more options to users
+    return {"search": product_name, "limit": 10}
+
+
+def normalize_query(product_name: str) -> str:
+    """Lower-cases and collapses whitespace so equivalent searches share a key."""
+    return " ".join(str(product_name).lower().split())
+
+
+def get_api_stats() -> dict[str, int]:
+    """Returns call/fetch/coalesce counters; calls - fetches = requests saved."""
+    return {
+        **API_STATS,
+        "inflight": len(_inflight),
+        **{f"limiter_{k}": v for k, v in limiter.stats.items()},
+        "quota_used_today": limiter.used_today,
+    }
+
+
+async def _fetch_products(
+    query: str, timeout: float | None, priority: int
+) -> list[dict[str, Any]]:
+    response = await _get_async(
+        PRODUCTS_URL, params=_search_params(query), timeout=timeout, priority=priority
+    )
+    return _parse_products(response.json())
+
+
+def _forget(key: tuple[str, int], task: asyncio.Task) -> None:
+    _inflight.pop(key, None)
+    # Mark the error as retrieved even if every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+async def _fetch_shared(
+    query: str, timeout: float | None, priority: int
+) -> list[dict[str, Any]]:
+    """
+    Joins an in-flight fetch for the same query in the same or a more urgent
+    lane, or starts a new one.
+    The fetch runs as its own task so a cancelled caller does not cancel it
+    for everyone else waiting on the same result.
+    """
+    normalized = normalize_query(query)
+    # Only join fetches queued in the same or a more urgent lane, so an
+    # interactive search never waits behind a bulk-priority request
+    task = next(
+        (
+            _inflight[(normalized, lane)]
+            for lane in range(PRIORITY_INTERACTIVE, priority + 1)
+            if (normalized, lane) in _inflight
+        ),
+        None,
+    )
+    if task is not None:
+        API_STATS["coalesced"] += 1
+    else:
+        API_STATS["fetches"] += 1
+        key = (normalized, priority)
+        task = asyncio.ensure_future(_fetch_products(normalized, timeout, priority))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _forget(key, t))
+
+    results = await asyncio.shield(task)
+    # Callers annotate products in place, so each one gets its own copies
+    return [dict(p) for p in results]
+
+
+async def get_product_price(
+    product_name: str,
+    multiple: bool = False,
+    timeout: float | None = None,
+    priority: int = PRIORITY_INTERACTIVE,
 ) -> dict[str, Any] | None | list[dict[str, Any]]:
     """
-    Fetches product data from the supermarket API.
+    Fetches product data from the supermarket API without blocking the event loop.
+    Concurrent calls for the same query share a single HTTP request, and every
+    request is paced by the shared limiter in the caller's priority lane.
     Increased limit to 10 to utilize the higher daily quota.
     """
-    url = f"{SUPER_API_BASE}/products"
-    headers = {"Authorization": f"Bearer {SUPER_API_KEY}"}
+    API_STATS["calls"] += 1
+    try:
+        return _shape(await _fetch_shared(product_name, timeout, priority), multiple)
+    except (
+        httpx.HTTPError,
+        QuotaExceededError,
+        KeyError,
+        ValueError,
+        TypeError,
+        AttributeError,
+    ) as e:
+        print(f"API Error: {e}")
+        return [] if multiple else None
+
+
+async def fetch_products(
+    product_name: str,
+    timeout: float | None = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> list[dict[str, Any]]:
+    """
+    Like get_product_price(multiple=True), but API errors propagate, so
+    callers can tell an empty result from a failed request.
+    """
+    API_STATS["calls"] += 1
+    return await _fetch_shared(product_name, timeout, priority)
 
-    # Increased limit from 5 to 10 to provide more options to users
-    params = {"search": product_name, "limit": 10}
 
+async def get_categories(priority: int = PRIORITY_BULK) -> list[dict[str, Any]]:
+    """Fetches the category list through the shared client and limiter."""
+    try:
+        response = await _get_async(CATEGORIES_URL, priority=priority)
+        return response.json().get("data", [])
+    except (httpx.HTTPError, QuotaExceededError, ValueError, AttributeError) as e:
+        print(f"API Error: {e}")
+        return []
+
+
+async def get_many_product_prices(
+    queries: list[str],
+    priority: int = PRIORITY_INTERACTIVE,
+    concurrency: int = 5,
+    on_result: Callable[[str, list[dict[str, Any]]], Awaitable[None]] | None = None,
+) -> dict[str, list[dict[str, Any]]]:
+    """
+    Fetches many queries concurrently (as multiple=True) under a semaphore.
+    Repeated queries are fetched once. Results are keyed by the query string
+    and `on_result` is awaited as each one resolves, e.g. to report progress.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: dict[str, list[dict[str, Any]]] = {}
+
+    async def fetch(query: str) -> None:
+        async with semaphore:
+            products = await get_product_price(query, multiple=True, priority=priority)
+        results[query] = products or []
+        if on_result:
+            await on_result(query, results[query])
+
+    await asyncio.gather(*(fetch(q) for q in dict.fromkeys(queries)))
+    return results
+
+
+def get_product_price_sync(
+    product_name: str, multiple: bool = False, timeout: float | None = None
+) -> dict[str, Any] | None | list[dict[str, Any]]:
+    """Blocking shim for code paths that have not moved to the async client yet."""
     try:
-        response = session.get(url, headers=headers, params=params, timeout=12)
-        response.raise_for_status()
-
-        json_response = response.json()
-        data = json_response.get("data", [])
-
-        if not data:
-            return [] if multiple else None
-
-        results = []
-        for p in data:
-            # Mapping API response to internal product structure
-            product_info = {
-                "id": p.get("id"),
-                "name": p.get("name", "Unknown Product"),
-                "price": p.get("price_lev", 0.0),
-                "price_eur": p.get("price_eur", 0.0),
-                "unit": p.get("quantity", "n/a"),
-                "quantity": p.get("quantity"),
-                "store": p.get("supermarket", {}).get("name", "Unknown Store"),
-                "supermarket": p.get("supermarket"),
-                "image": p.get("image_url"),
-                "image_url": p.get("image_url"),
-                "discount": p.get("discount"),
-                "brochure": p.get("brochure"),
-            }
-            results.append(product_info)
-
-        if multiple:
-            return results
-        return results[0] if results else None
-
-    except (requests.exceptions.RequestException, KeyError, ValueError, TypeError) as e:
+        response = _get_sync(
+            PRODUCTS_URL, params=_search_params(product_name), timeout=timeout
+        )
+        return _shape(_parse_products(response.json()), multiple)
+    except (
+        httpx.HTTPError,
+        QuotaExceededError,
+        KeyError,
+        ValueError,
+        TypeError,
+        AttributeError,
+    ) as e:
         print(f"API Error: {e}")
         return [] if multiple else None
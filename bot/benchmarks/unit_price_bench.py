@@ -0,0 +1,68 @@
+"""
+Micro-benchmark of calculate_unit_price against the previous implementation.
+Run from the bot directory: python -m benchmarks.unit_price_bench
+"""
+
+import random
+import re
+import timeit
+
+from utils.helpers import calculate_unit_price
+from utils.unit_parser import parse_quantity
+
+LABELS = [
+    "500 g",
+    "1 kg",
+    "1.5 L",
+    "1,5 л",
+    "330 мл",
+    "6 x 1.5 L",
+    "2х250 мл",
+    "10 бр",
+    "400 гр",
+    "75 cl",
+]
+
+
+def legacy_unit_price(price, unit_str):
+    """calculate_unit_price before utils.unit_parser, kept for comparison."""
+    if not unit_str or price is None:
+        return None, None
+    match = re.search(r"(\d+[\.,]?\d*)\s*([a-zA-Zа-яА-Я]+)", str(unit_str).lower())
+    if not match:
+        return None, None
+    try:
+        value = float(match.group(1).replace(",", "."))
+        unit = match.group(2)
+    except (ValueError, IndexError):
+        return None, None
+    weight_units = ["g", "гр", "г", "kg", "кг"]
+    base_unit = "kg" if unit in weight_units else "l"
+    norm_value = value
+    if unit in ["g", "гр", "г", "ml", "мл"]:
+        norm_value = value / 1000
+    if norm_value > 0:
+        return round(price / norm_value, 2), base_unit
+    return None, None
+
+
+def main(calls: int = 200_000):
+    random.seed(0)
+    workload = [(random.uniform(0.5, 20), random.choice(LABELS)) for _ in range(calls)]
+
+    def run(fn):
+        for price, label in workload:
+            fn(price, label)
+
+    parse_quantity.cache_clear()
+    for name, fn in (
+        ("legacy", legacy_unit_price),
+        ("unit_parser", calculate_unit_price),
+    ):
+        seconds = min(timeit.repeat(lambda: run(fn), number=1, repeat=5))
+        print(f"{name:>12}: {seconds * 1e9 / calls:7.0f} ns/call ({calls} calls)")
+    print(f"{'cache':>12}: {parse_quantity.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,3 +20,16 @@ if not ADMIN_ID:
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+# Supermarket API client tuning
+SUPER_API_TIMEOUT = float(os.getenv("SUPER_API_TIMEOUT", 12))
+SUPER_API_MAX_CONNECTIONS = int(os.getenv("SUPER_API_MAX_CONNECTIONS", 10))
+SUPER_API_RATE = float(os.getenv("SUPER_API_RATE", 1.0))  # requests per second
+SUPER_API_BURST = int(os.getenv("SUPER_API_BURST", 3))
+SUPER_API_DAILY_QUOTA = int(os.getenv("SUPER_API_DAILY_QUOTA", 0))  # 0 = no cap
+
+# Shopping cart optimizer: max stores to visit (0 = no cap)
+OPTIMIZER_MAX_STORES = int(os.getenv("OPTIMIZER_MAX_STORES", 2))
+
+# Local files (bulk crawl checkpoint, catalog); relative to the working dir
+DATA_DIR = os.getenv("DATA_DIR", "data")
@@ -1,9 +1,49 @@
 from datetime import datetime, timedelta
 
 from db.supabase_client import supabase
+from services.cache import TTLCache
+from services.product_index import index_products
 
 CACHE_TABLE = "search_cache"
 
+# In-process tier in front of the search_cache table
+MEMORY_CACHE_SIZE = 512
+MEMORY_CACHE_TTL = 600  # seconds
+
+_memory_cache = TTLCache(maxsize=MEMORY_CACHE_SIZE, ttl=MEMORY_CACHE_TTL)
+
+
+def _parse_created_at(raw: str) -> datetime:
+    return datetime.fromisoformat(raw.replace("Z", "+00:00"))
+
+
+def _copy_results(results: list) -> list:
+    # Handlers annotate and sort results in place; keep the cached copy intact
+    return [dict(p) for p in results]
+
+
+def _load_entry(query: str) -> dict | None:
+    """Read-through: memory first, then Supabase (which refills memory)."""
+    entry = _memory_cache.get(query)
+    if entry is not None:
+        return entry
+
+    response = supabase.table(CACHE_TABLE).select("*").eq("query", query).execute()
+    if not response.data:
+        return None
+
+    cache_data = response.data[0]
+    entry = {
+        "results": cache_data["results"],
+        "created_at": _parse_created_at(cache_data["created_at"]),
+    }
+    _memory_cache.set(query, entry)
+    return entry
+
+
+def _is_fresh(created_at: datetime, expiry_hours: int) -> bool:
+    return datetime.now(created_at.tzinfo) < created_at + timedelta(hours=expiry_hours)
+
 
 def get_cached_results(query: str, expiry_hours: int = 24):
     """
@@ -12,37 +52,52 @@ def get_cached_results(query: str, expiry_hours: int = 24):
     """
     try:
         query = query.lower().strip()
-        response = supabase.table(CACHE_TABLE).select("*").eq("query", query).execute()
+        entry = _load_entry(query)
 
-        if response.data:
-            cache_data = response.data[0]
-            created_at = datetime.fromisoformat(
-                cache_data["created_at"].replace("Z", "+00:00")
-            )
-
-            # Check if cache is still fresh
-            if datetime.now(created_at.tzinfo) < created_at + timedelta(
-                hours=expiry_hours
-            ):
-                return cache_data["results"]
-
-            # If expired, we return None to force a fresh API search,
-            # but we keep the data in DB for emergency fallback.
+        # Check if cache is still fresh
+        if entry and _is_fresh(entry["created_at"], expiry_hours):
+            return _copy_results(entry["results"])
 
+        # If expired, we return None to force a fresh API search,
+        # but we keep the data in DB for emergency fallback.
         return None
     except Exception as e:
         print(f"Cache Read Error: {e}")
         return None
 
 
+def get_cached_entry(query: str, expiry_hours: int = 24) -> tuple[list | None, bool]:
+    """
+    Stale-while-revalidate read: returns (results, is_stale).
+    Expired rows are still served, flagged as stale, so the caller can answer
+    immediately and refresh the row in the background.
+    """
+    try:
+        query = query.lower().strip()
+        entry = _load_entry(query)
+        if not entry or not entry["results"]:
+            return None, False
+
+        is_stale = not _is_fresh(entry["created_at"], expiry_hours)
+        return _copy_results(entry["results"]), is_stale
+    except Exception as e:
+        print(f"Cache Read Error: {e}")
+        return None, False
+
+
 def set_cache_results(query: str, results: list):
-    """Saves or updates search results in the cloud cache."""
+    """Saves or updates search results in memory and in the cloud cache."""
     try:
         query = query.lower().strip()
+        created_at = datetime.now()
+        _memory_cache.set(
+            query, {"results": _copy_results(results), "created_at": created_at}
+        )
+        index_products(results)
         payload = {
             "query": query,
             "results": results,
-            "created_at": datetime.now().isoformat(),
+            "created_at": created_at.isoformat(),
         }
         # upsert updates the record if the query already exists
         supabase.table(CACHE_TABLE).upsert(payload).execute()
@@ -50,6 +105,11 @@ def set_cache_results(query: str, results: list):
         print(f"Cache Write Error: {e}")
 
 
+def get_cache_stats() -> dict[str, int]:
+    """Hit/miss/eviction counters of the in-process tier."""
+    return _memory_cache.stats()
+
+
 def get_all_cached_products():
     """Returns all cached product lists from the cloud cache for price comparison."""
     try:
@@ -80,6 +80,27 @@ def delete_favorite(user_id: int, product_id: str) -> bool:
         return False
 
 
+def update_favorite_prices(new_prices: Dict[str, float]) -> int:
+    """
+    Applies {favorite row id: new price_eur} with one update per distinct
+    price instead of one per row. Returns the number of rows sent.
+    """
+    by_price: Dict[float, List[str]] = {}
+    for fav_id, price in new_prices.items():
+        by_price.setdefault(price, []).append(fav_id)
+
+    updated = 0
+    for price, ids in by_price.items():
+        try:
+            supabase.table(FAVORITES_TABLE).update({"price_eur": price}).in_(
+                "id", ids
+            ).execute()
+            updated += len(ids)
+        except Exception as e:
+            print(f"Supabase Favorites Price Update Error: {e}")
+    return updated
+
+
 def get_all_favorites_from_db():
     """Fetches all favorites. Using your exact schema columns."""
     try:
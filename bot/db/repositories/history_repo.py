@@ -1,8 +1,33 @@
 from datetime import datetime
 from typing import Dict, List, Optional
+
 from db.supabase_client import supabase
 
 HISTORY_TABLE = "price_history"
+HISTORY_CONFLICT_KEY = "product_id,store,recorded_date"
+UPSERT_CHUNK_SIZE = 500
+PREVIOUS_PRICE_ROWS_PER_ID = 15
+
+
+def _history_payload(
+    product_id: str,
+    name: str,
+    store: str,
+    price: float,
+    unit_price: Optional[float] = None,
+    base_unit: Optional[str] = None,
+    date_str: Optional[str] = None,
+) -> Dict:
+    record_date = date_str if date_str else datetime.now().strftime("%Y-%m-%d")
+    return {
+        "product_id": str(product_id).strip(),
+        "name": name,
+        "store": store,
+        "price": float(price),
+        "unit_price": float(unit_price) if unit_price else None,
+        "base_unit": base_unit,  # e.g., 'kg', 'l', 'pc'
+        "recorded_date": record_date,
+    }
 
 
 def add_price_entry(
@@ -19,25 +44,50 @@ def add_price_entry(
     Uses upsert to prevent daily duplicates for the same product/store.
     """
     try:
-        record_date = date_str if date_str else datetime.now().strftime("%Y-%m-%d")
-
-        payload = {
-            "product_id": str(product_id).strip(),
-            "name": name,
-            "store": store,
-            "price": float(price),
-            "unit_price": float(unit_price) if unit_price else None,
-            "base_unit": base_unit,  # e.g., 'kg', 'l', 'pc'
-            "recorded_date": record_date,
-        }
+        payload = _history_payload(
+            product_id, name, store, price, unit_price, base_unit, date_str
+        )
 
         # Upsert ensures we only have ONE price per product per store per day
-        supabase.table(HISTORY_TABLE).upsert(payload).execute()
+        supabase.table(HISTORY_TABLE).upsert(
+            payload, on_conflict=HISTORY_CONFLICT_KEY
+        ).execute()
 
     except Exception as e:
         print(f"Supabase History Upsert Error: {e}")
 
 
+def add_price_entries(records: List[Dict]) -> int:
+    """
+    Bulk version of add_price_entry: takes dicts with the same keyword
+    arguments and upserts them in chunks. Returns the number of rows written.
+    """
+    # Postgres rejects a statement that touches the same conflict key twice,
+    # so duplicates within the batch are collapsed (last one wins)
+    payloads = {}
+    for record in records:
+        try:
+            payload = _history_payload(**record)
+        except (TypeError, ValueError) as e:
+            print(f"Skipping invalid history record: {e}")
+            continue
+        key = (payload["product_id"], payload["store"], payload["recorded_date"])
+        payloads[key] = payload
+
+    rows = list(payloads.values())
+    written = 0
+    for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[i : i + UPSERT_CHUNK_SIZE]
+        try:
+            supabase.table(HISTORY_TABLE).upsert(
+                chunk, on_conflict=HISTORY_CONFLICT_KEY
+            ).execute()
+            written += len(chunk)
+        except Exception as e:
+            print(f"Supabase History Bulk Upsert Error: {e}")
+    return written
+
+
 def get_best_deals_by_category(product_name_part: str, limit: int = 5) -> List[Dict]:
     """
     Experimental: Finds the best unit prices for a similar product across different stores.
@@ -77,6 +127,70 @@ def get_product_history(product_id: str, limit: int = 15) -> List[Dict]:
         return []
 
 
+# Flipped off when the database does not have previous_prices yet
+_previous_rpc_available = True
+
+
+def _fetch_recent_rows(ids: List[str]) -> List[Dict]:
+    """Rows of the last two recorded days of each id, newest first per id."""
+    global _previous_rpc_available
+    if _previous_rpc_available:
+        try:
+            response = supabase.rpc("previous_prices", {"p_ids": ids}).execute()
+            return response.data or []
+        except Exception as e:
+            print(f"Supabase Previous Prices Error: {e}")
+            # PGRST202: function not found, stop trying it. Other errors fall
+            # back to the per-id queries below for this call only.
+            if "PGRST202" in str(e):
+                _previous_rpc_available = False
+
+    # Fallback: one bounded query per id, so each id gets its own window
+    rows = []
+    for pid in ids:
+        try:
+            response = (
+                supabase.table(HISTORY_TABLE)
+                .select("product_id, price, recorded_date")
+                .eq("product_id", pid)
+                .order("recorded_date", desc=True)
+                .limit(PREVIOUS_PRICE_ROWS_PER_ID)
+                .execute()
+            )
+            rows.extend(response.data or [])
+        except Exception as e:
+            print(f"Supabase Previous Prices Error: {e}")
+    return rows
+
+
+def get_previous_prices(product_ids: List[str]) -> Dict[str, float]:
+    """
+    Returns {product_id: price on the second most recent recorded day} for many
+    products with one RPC call, instead of a get_product_history per id.
+    """
+    ids = list(dict.fromkeys(str(pid).strip() for pid in product_ids if pid))
+    if not ids:
+        return {}
+
+    # Newest first: keep the first two distinct days seen per product
+    days: Dict[str, List[Dict]] = {}
+    for row in _fetch_recent_rows(ids):
+        seen = days.setdefault(row["product_id"], [])
+        if len(seen) < 2 and all(
+            r["recorded_date"] != row["recorded_date"] for r in seen
+        ):
+            seen.append(row)
+
+    previous = {}
+    for pid, rows in days.items():
+        if len(rows) > 1:
+            try:
+                previous[pid] = float(rows[1]["price"])
+            except (TypeError, ValueError):
+                continue
+    return previous
+
+
 def get_latest_price(product_id: str, store: str) -> Optional[float]:
     """Gets the most recent price for a product in a specific store."""
     try:
@@ -40,6 +40,38 @@ def update_last_prices(user_id: int, last_prices: dict):
     )
 
 
+# Flipped off when the database does not have update_last_prices yet
+_bulk_rpc_available = True
+
+
+def update_last_prices_bulk(rows: list[dict]):
+    """
+    Writes new last_prices for many baskets in one round-trip.
+    Expects [{"user_id": ..., "last_prices": {...}}]; only existing rows are
+    updated and nothing else in them is touched.
+    """
+    global _bulk_rpc_available
+    if not rows:
+        return None
+
+    if _bulk_rpc_available:
+        try:
+            return supabase.rpc("update_last_prices", {"p_rows": rows}).execute()
+        except Exception as e:
+            print(f"Error updating last prices in bulk: {e}")
+            # PGRST202: function not found, stop trying it. Other errors fall
+            # back to the per-row updates below for this call only.
+            if "PGRST202" in str(e):
+                _bulk_rpc_available = False
+
+    for row in rows:
+        try:
+            update_last_prices(row["user_id"], row["last_prices"])
+        except Exception as e:
+            print(f"Error updating last prices for {row['user_id']}: {e}")
+    return None
+
+
 def get_user_basket(user_id: int):
     """Fetches the current basket. Safe against missing rows."""
     try:
@@ -1,10 +1,55 @@
+from contextvars import ContextVar
 from datetime import datetime, timezone
 
 from db.supabase_client import supabase
+from services.cache import TTLCache
 
 # Constants for limits
 FREE_USER_DAILY_LIMIT = 20
 
+# Short-lived cross-update cache of users rows, kept in sync on every write
+USER_STATUS_TTL = 30  # seconds
+_status_cache = TTLCache(maxsize=2048, ttl=USER_STATUS_TTL)
+
+# Row loaded once for the Telegram update currently being processed
+_request_user: ContextVar[dict | None] = ContextVar("request_user", default=None)
+
+
+def _cached_status(user_id: int) -> dict | None:
+    scoped = _request_user.get()
+    if scoped is not None and scoped.get("id") == user_id:
+        return scoped
+    return _status_cache.get(user_id)
+
+
+def _remember_status(user_id: int, data: dict) -> None:
+    _status_cache.set(user_id, data)
+    scoped = _request_user.get()
+    if scoped is not None and scoped.get("id") == user_id:
+        _request_user.set(data)
+
+
+def invalidate_user_status(user_id: int) -> None:
+    """Drops cached copies of a user's row after a write we cannot mirror."""
+    _status_cache.delete(user_id)
+    scoped = _request_user.get()
+    if scoped is not None and scoped.get("id") == user_id:
+        _request_user.set(None)
+
+
+def load_request_user(user_id: int | None) -> dict | None:
+    """
+    Binds the user's row to the current update. Called once per update so
+    every later status lookup for this user is answered from memory.
+    """
+    _request_user.set(None)
+    if user_id is None:
+        return None
+
+    status = get_user_subscription_status(user_id)
+    _request_user.set(status)
+    return status
+
 
 def create_user_if_not_exists(user):
     """Creates a user record if it doesn't exist, keeping settings intact."""
@@ -14,6 +59,8 @@ def create_user_if_not_exists(user):
         if existing.data:
             return existing.data
 
+        invalidate_user_status(user.id)
+
         user_data = {
             "id": user.id,
             "username": user.username,
@@ -34,14 +81,17 @@ def create_user_if_not_exists(user):
 def get_user_subscription_status(user_id: int):
     """Returns user status and handles daily counter resets."""
     try:
-        response = (
-            supabase.table("users").select("*").eq("id", user_id).single().execute()
-        )
+        data = _cached_status(user_id)
+        if data is None:
+            response = (
+                supabase.table("users").select("*").eq("id", user_id).single().execute()
+            )
 
-        if not response.data:
-            return None
+            if not response.data:
+                return None
+
+            data = response.data
 
-        data = response.data
         today = datetime.now().date().isoformat()
 
         # Check if daily reset is needed
@@ -53,43 +103,153 @@ def get_user_subscription_status(user_id: int):
             data["daily_request_count"] = 0
             data["last_request_date"] = today
 
+        _remember_status(user_id, data)
         return data
     except Exception as e:
         print(f"Error fetching user status: {e}")
         return None
 
 
-def can_user_make_request(user_id: int) -> bool:
-    """Checks if the user has remaining daily requests or is premium."""
+def _premium_active(row: dict) -> bool:
+    if not row.get("is_premium"):
+        return False
+    if not row.get("premium_until"):
+        return True
+    expiry = datetime.fromisoformat(row["premium_until"].replace("Z", "+00:00"))
+    return expiry > datetime.now(timezone.utc)
+
+
+def local_consume_request(
+    row: dict, today: str, limit: int, increment: bool = True
+) -> dict:
+    """
+    Pure-Python stand-in for the consume_request SQL function (db/sql).
+    Applies the same reset/increment to `row` and returns the RPC's result row.
+    Used in tests and as the fallback when the function is not deployed.
+    """
+    count = row.get("daily_request_count") or 0
+    if row.get("last_request_date") != today:
+        count = 0
+    if increment:
+        count += 1
+
+    row["daily_request_count"] = count
+    row["last_request_date"] = today
+    premium = _premium_active(row)
+    return {
+        "request_count": count,
+        "last_request_date": today,
+        "premium": premium,
+        "allowed": premium or count - int(increment) < limit,
+    }
+
+
+# Flipped off when the database does not have consume_request yet
+_counter_rpc_available = True
+
+
+def _mirror_counter(user_id: int, result: dict | None) -> None:
+    status = _cached_status(user_id)
+    if status is None or not result:
+        return
+    status["daily_request_count"] = result["request_count"]
+    status["last_request_date"] = str(result["last_request_date"])
+    _remember_status(user_id, status)
+
+
+def _consume_request(user_id: int, increment: bool) -> dict | None:
+    """Daily reset, optional increment and limit check in one round-trip."""
+    global _counter_rpc_available
+    today = datetime.now().date().isoformat()
+
+    if _counter_rpc_available:
+        try:
+            response = supabase.rpc(
+                "consume_request",
+                {
+                    "p_user_id": user_id,
+                    "p_today": today,
+                    "p_limit": FREE_USER_DAILY_LIMIT,
+                    "p_increment": increment,
+                },
+            ).execute()
+            result = response.data[0] if response.data else None
+            _mirror_counter(user_id, result)
+            return result
+        except Exception as e:
+            print(f"Request Counter RPC Error: {e}")
+            # PGRST202: function not found, stop trying it. Other errors fall
+            # back to the read-modify-write below for this call only.
+            if "PGRST202" in str(e):
+                _counter_rpc_available = False
+
+    # Fallback: the old read-modify-write through the cached row
+    status = get_user_subscription_status(user_id)
+    if not status:
+        return None
+    result = local_consume_request(status, today, FREE_USER_DAILY_LIMIT, increment)
+    if increment:
+        supabase.table("users").update(
+            {"daily_request_count": result["request_count"], "last_request_date": today}
+        ).eq("id", user_id).execute()
+    _remember_status(user_id, status)
+    return result
+
+
+def get_users_status_bulk(user_ids: list[int]) -> dict[int, dict]:
+    """
+    Loads many users rows in one query for scheduled jobs, keyed by id.
+    Rows are also placed in the short-lived status cache.
+    """
+    ids = list(dict.fromkeys(user_ids))
+    if not ids:
+        return {}
     try:
-        status = get_user_subscription_status(user_id)
-        if not status:
-            return False
+        response = supabase.table("users").select("*").in_("id", ids).execute()
+        rows = {row["id"]: row for row in response.data or []}
+        for user_id, row in rows.items():
+            _status_cache.set(user_id, row)
+        return rows
+    except Exception as e:
+        print(f"Error fetching users in bulk: {e}")
+        return {}
 
-        # Premium users have unlimited access
-        if is_user_premium(user_id):
-            return True
 
-        # Regular users are limited to 20 requests per day
-        return status.get("daily_request_count", 0) < FREE_USER_DAILY_LIMIT
+def can_user_make_request(user_id: int) -> bool:
+    """Checks if the user has remaining daily requests or is premium."""
+    try:
+        today = datetime.now().date().isoformat()
+        status = _cached_status(user_id)
+
+        # Row already loaded for today: answer without a network hop
+        if status is not None and status.get("last_request_date") == today:
+            result = local_consume_request(
+                dict(status), today, FREE_USER_DAILY_LIMIT, increment=False
+            )
+        else:
+            result = _consume_request(user_id, increment=False)
+
+        # Premium users have unlimited access,
+        # regular users are limited to 20 requests per day
+        return bool(result and result["allowed"])
     except Exception as e:
         print(f"Error checking request permission: {e}")
         return False
 
 
-def increment_request_count(user_id: int):
-    """Increments the daily request counter for a user."""
+def increment_request_count(user_id: int) -> bool:
+    """
+    Atomically resets (if needed) and increments the daily request counter.
+    Returns whether this request is within the limit (always True for premium).
+    """
     try:
-        status = get_user_subscription_status(user_id)
-        if status:
-            new_count = status["daily_request_count"] + 1
-            supabase.table("users").update({"daily_request_count": new_count}).eq(
-                "id", user_id
-            ).execute()
-            return new_count
+        result = _consume_request(user_id, increment=True)
+        if result:
+            return bool(result["allowed"])
     except Exception as e:
         print(f"Error incrementing count: {e}")
-    return None
+    # Counter unavailable: do not lock users out because of our own outage
+    return True
 
 
 def is_user_premium(user_id: int) -> bool:
@@ -108,6 +268,8 @@ def is_user_premium(user_id: int) -> bool:
                 supabase.table("users").update({"is_premium": False}).eq(
                     "id", user_id
                 ).execute()
+                status["is_premium"] = False
+                _remember_status(user_id, status)
                 return False
         return True
     except Exception as e:
@@ -116,16 +278,11 @@ def is_user_premium(user_id: int) -> bool:
 
 
 def get_notification_state(user_id: int) -> bool:
-    """Fetches the notification preference."""
+    """Fetches the notification preference from the (cached) user row."""
     try:
-        response = (
-            supabase.table("users")
-            .select("notifications_enabled")
-            .eq("id", user_id)
-            .execute()
-        )
-        if response.data:
-            return response.data[0]["notifications_enabled"]
+        status = get_user_subscription_status(user_id)
+        if status:
+            return status.get("notifications_enabled", True)
         return True
     except Exception as e:
         print(f"Notification Fetch Error: {e}")
@@ -142,6 +299,11 @@ def toggle_notifications(user_id: int) -> bool:
             "id", user_id
         ).execute()
 
+        status = _cached_status(user_id)
+        if status is not None:
+            status["notifications_enabled"] = new_state
+            _remember_status(user_id, status)
+
         return new_state
     except Exception as e:
         print(f"Notification Toggle Error: {e}")
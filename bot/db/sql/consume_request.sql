@@ -0,0 +1,46 @@
+-- Atomic daily request counter used by db/repositories/user_repo.py.
+-- Resets the counter on a new day, optionally increments it and reports
+-- whether the user may search, all in a single UPDATE ... RETURNING.
+--
+-- p_today is passed by the bot so the reset follows the same calendar day
+-- as the rest of the Python code.
+
+create or replace function consume_request(
+    p_user_id bigint,
+    p_today date,
+    p_limit integer,
+    p_increment boolean default true
+)
+returns table (
+    request_count integer,
+    last_request_date date,
+    premium boolean,
+    allowed boolean
+)
+language sql
+as $$
+    with counted as (
+        update users u
+        set daily_request_count =
+                (case when u.last_request_date::date = p_today
+                      then coalesce(u.daily_request_count, 0)
+                      else 0 end)
+                + (case when p_increment then 1 else 0 end),
+            last_request_date = p_today
+        where u.id = p_user_id
+        returning
+            u.daily_request_count,
+            u.last_request_date::date as last_request_date,
+            coalesce(u.is_premium, false)
+                and (u.premium_until is null or u.premium_until > now())
+                as premium
+    )
+    select
+        c.daily_request_count,
+        c.last_request_date,
+        c.premium,
+        c.premium
+            or c.daily_request_count
+               - (case when p_increment then 1 else 0 end) < p_limit
+    from counted c;
+$$;
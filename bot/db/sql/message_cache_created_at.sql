@@ -0,0 +1,8 @@
+-- message_cache is pruned by age: Telegram only lets bots delete messages
+-- younger than 48 hours, so older ids are useless (utils/message_cache.py).
+
+alter table message_cache
+    add column if not exists created_at timestamptz not null default now();
+
+create index if not exists message_cache_user_id_idx on message_cache (user_id);
+create index if not exists message_cache_created_at_idx on message_cache (created_at);
@@ -0,0 +1,25 @@
+-- Last two recorded days per product, used by get_previous_prices in
+-- db/repositories/history_repo.py for the search trend arrows.
+-- The window is per product_id, so products with many recent rows cannot
+-- crowd out the older day of a product with sparse history.
+
+create or replace function previous_prices(p_ids text[])
+returns table (product_id text, price double precision, recorded_date date)
+language sql
+stable
+as $$
+    select r.product_id, r.price, r.recorded_date
+    from (
+        select
+            h.product_id,
+            h.price::double precision as price,
+            h.recorded_date::date as recorded_date,
+            dense_rank() over (
+                partition by h.product_id order by h.recorded_date::date desc
+            ) as day_rank
+        from price_history h
+        where h.product_id = any(p_ids)
+    ) r
+    where r.day_rank <= 2
+    order by r.product_id, r.recorded_date desc;
+$$;
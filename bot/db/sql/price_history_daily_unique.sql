@@ -0,0 +1,21 @@
+-- One price per product, store and day. history_repo upserts with
+-- on_conflict=(product_id, store, recorded_date), which needs this index.
+--
+-- Run this before deploying the bulk history writes: without the index
+-- every upsert is rejected. Older code inserted without a conflict target,
+-- so duplicates are removed first, keeping the last written row per key
+-- (highest ctid, as the table has no guaranteed id column).
+
+begin;
+
+delete from price_history older
+using price_history newer
+where older.product_id = newer.product_id
+  and older.store = newer.store
+  and older.recorded_date = newer.recorded_date
+  and older.ctid < newer.ctid;
+
+create unique index if not exists price_history_daily_uniq
+    on price_history (product_id, store, recorded_date);
+
+commit;
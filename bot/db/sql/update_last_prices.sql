@@ -0,0 +1,15 @@
+-- Bulk baseline update used by db/repositories/smart_basket_repo.py.
+-- Writes only last_prices for baskets that already exist; rows are never
+-- inserted, so a basket deleted while the job ran stays deleted.
+--
+-- p_rows is a JSON array of {"user_id": ..., "last_prices": {...}}.
+
+create or replace function update_last_prices(p_rows jsonb)
+returns void
+language sql
+as $$
+    update smart_baskets b
+    set last_prices = r.last_prices
+    from jsonb_to_recordset(p_rows) as r(user_id bigint, last_prices jsonb)
+    where b.user_id = r.user_id;
+$$;
@@ -1,60 +1,198 @@
-import requests
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
 from telegram import Update, constants
 from telegram.ext import ContextTypes
 
-from api.supermarket import get_product_price
-from config.settings import ADMIN_ID, SUPER_API_BASE, SUPER_API_KEY
-from db.repositories.history_repo import add_price_entry
+from api.supermarket import PRIORITY_BULK, fetch_products, get_categories
+from config.settings import ADMIN_ID, DATA_DIR
+from db.repositories.history_repo import add_price_entries
+from services.catalog import upsert_products
+from services.product_index import index_products
 from utils.helpers import calculate_unit_price, get_product_id
 from utils.message_cache import add_message
 
-CATEGORIES_URL = f"{SUPER_API_BASE}/categories"
+BULK_CONCURRENCY = 4
+CHECKPOINT_FILE = os.path.join(DATA_DIR, "bulk_checkpoint.json")
+# Just under the 2-day Mon -> Wed gap: a scheduled run never resumes the
+# previous run's checkpoint, while a restart resumes it (see main.on_startup)
+CHECKPOINT_MAX_AGE = timedelta(hours=44)
+RESUME_JOB_NAME = "bulk_resume"
+
+
+def _read_checkpoint() -> dict | None:
+    try:
+        with open(CHECKPOINT_FILE, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        started = datetime.fromisoformat(checkpoint["started_at"])
+        if datetime.now() - started < CHECKPOINT_MAX_AGE:
+            return checkpoint
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Bulk Checkpoint Read Error: {e}")
+    return None
+
+
+def _load_checkpoint() -> dict:
+    """Returns the unfinished run to resume, or a fresh one."""
+    return _read_checkpoint() or {"started_at": datetime.now().isoformat(), "done": {}}
 
 
-async def run_bulk_logic(context: ContextTypes.DEFAULT_TYPE):
-    """Internal logic to fetch categories and update database."""
-    headers = {"Authorization": f"Bearer {SUPER_API_KEY}"}
+def has_unfinished_checkpoint() -> bool:
+    """True when an interrupted run is recent enough to be resumed."""
+    return _read_checkpoint() is not None
 
+
+def _save_checkpoint(checkpoint: dict):
+    # Write-then-rename so a crash never leaves a half-written file
     try:
-        response = requests.get(CATEGORIES_URL, headers=headers)
-        response.raise_for_status()
-        categories_data = response.json().get("data", [])
-
-        total_added = 0
-        for category in categories_data:
-            category_name = category.get("name")
-            if not category_name:
-                continue
-
-            products = get_product_price(category_name, multiple=True)
-            if not products:
-                continue
-
-            for p in products:
-                price_val = p.get("price_eur") or p.get("price")
-                unit_val = p.get("quantity") or p.get("unit")
-                u_price, u_unit = calculate_unit_price(price_val, unit_val)
-
-                store_info = p.get("supermarket")
-                curr_store = (
-                    store_info.get("name")
-                    if isinstance(store_info, dict)
-                    else p.get("store", "Unknown")
-                )
-
-                add_price_entry(
-                    product_id=get_product_id(p),
-                    name=p.get("name", "N/A"),
-                    store=curr_store,
-                    price=float(price_val) if price_val else 0.0,
-                    unit_price=u_price,
-                    base_unit=u_unit,
-                )
-                total_added += 1
-        return len(categories_data), total_added
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp_path = f"{CHECKPOINT_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(tmp_path, CHECKPOINT_FILE)
+    except OSError as e:
+        print(f"Bulk Checkpoint Write Error: {e}")
+
+
+def _clear_checkpoint():
+    try:
+        os.remove(CHECKPOINT_FILE)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Bulk Checkpoint Delete Error: {e}")
+
+
+def _history_records(products: list) -> list[dict]:
+    records = []
+    for p in products:
+        price_val = p.get("price_eur") or p.get("price")
+        unit_val = p.get("quantity") or p.get("unit")
+        u_price, u_unit = calculate_unit_price(price_val, unit_val)
+
+        store_info = p.get("supermarket")
+        curr_store = (
+            store_info.get("name")
+            if isinstance(store_info, dict)
+            else p.get("store", "Unknown")
+        )
+
+        records.append(
+            {
+                "product_id": get_product_id(p),
+                "name": p.get("name", "N/A"),
+                "store": curr_store,
+                "price": float(price_val) if price_val else 0.0,
+                "unit_price": u_price,
+                "base_unit": u_unit,
+            }
+        )
+    return records
+
+
+async def _crawl_category(name: str) -> dict | None:
+    """
+    Fetches one category, stores its history rows and refreshes the local
+    catalog and product index; returns the category's stats.
+    API errors propagate, so only they leave the category for the resume.
+    """
+    started = time.monotonic()
+    products = await fetch_products(name, priority=PRIORITY_BULK)
+    if not products:
+        return {
+            "products": 0,
+            "added": 0,
+            "seconds": round(time.monotonic() - started, 2),
+        }
+    added = await asyncio.to_thread(add_price_entries, _history_records(products))
+    await asyncio.to_thread(upsert_products, products)
+    index_products(products)
+    return {
+        "products": len(products),
+        "added": added,
+        "seconds": round(time.monotonic() - started, 2),
+    }
+
+
+async def run_bulk_logic(context: ContextTypes.DEFAULT_TYPE) -> dict:
+    """
+    Crawls every category with bounded concurrency in the bulk limiter lane.
+    Finished categories are checkpointed to DATA_DIR, so an interrupted run
+    resumes where it stopped. Returns a report for the admin message.
+    """
+    started = time.monotonic()
+    report = {
+        "categories": 0,
+        "resumed": 0,
+        "failed": 0,
+        "products": 0,
+        "crawled": 0,
+        "added": 0,
+        "seconds": 0.0,
+        "slowest": [],
+    }
+
+    try:
+        categories = await get_categories()
+        names = list(dict.fromkeys(c.get("name") for c in categories if c.get("name")))
+        if not names:
+            return report
+
+        checkpoint = _load_checkpoint()
+        done = checkpoint["done"]
+        report["categories"] = len(names)
+        report["resumed"] = sum(1 for name in names if name in done)
+
+        semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+        async def crawl(name: str):
+            async with semaphore:
+                try:
+                    stats = await _crawl_category(name)
+                except Exception as e:
+                    print(f"Bulk Category Error ({name}): {e}")
+                    report["failed"] += 1
+                    return
+            done[name] = stats
+            report["crawled"] += stats["products"]
+            _save_checkpoint(checkpoint)
+
+        await asyncio.gather(*(crawl(name) for name in names if name not in done))
+
+        timings = [(name, done[name]) for name in names if name in done]
+        report["products"] = sum(stats["products"] for _, stats in timings)
+        report["added"] = sum(stats["added"] for _, stats in timings)
+        report["slowest"] = sorted(timings, key=lambda t: -t[1]["seconds"])[:5]
+
+        # Keep the checkpoint while categories are still missing
+        if not report["failed"]:
+            _clear_checkpoint()
     except Exception as e:
         print(f"Bulk Logic Error: {e}")
-        return 0, 0
+
+    report["seconds"] = round(time.monotonic() - started, 1)
+    return report
+
+
+def format_bulk_report(title: str, report: dict) -> str:
+    seconds = report["seconds"] or 1
+    lines = [
+        f"✅ *{title}*",
+        f"Categories: {report['categories']} "
+        f"(resumed {report['resumed']}, failed {report['failed']})",
+        f"Products: {report['products']} | History rows: {report['added']}",
+        f"Time: {report['seconds']}s | {report['crawled'] / seconds:.1f} products/s",
+    ]
+    if report["slowest"]:
+        lines.append("\n🐢 *Slowest categories:*")
+        for name, stats in report["slowest"]:
+            lines.append(f"• {name}: {stats['seconds']}s ({stats['products']} items)")
+    return "\n".join(lines)
 
 
 async def bulk_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -65,30 +203,35 @@ async def bulk_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     status_msg = await update.message.reply_text("🔄 Starting manual bulk update...")
-    cats, items = await run_bulk_logic(context)
+    report = await run_bulk_logic(context)
 
     await status_msg.edit_text(
-        f"✅ *Manual Bulk Complete!*\nCategories: {cats}\nItems: {items}",
+        format_bulk_report("Manual Bulk Complete!", report),
         parse_mode=constants.ParseMode.MARKDOWN,
     )
 
 
 async def bulk_job_wrapper(context: ContextTypes.DEFAULT_TYPE):
     """Wrapper function for the Scheduler (Job Queue)."""
+    resuming = context.job is not None and context.job.name == RESUME_JOB_NAME
     # Notify admin that auto-update started
     msg_start = await context.bot.send_message(
         chat_id=ADMIN_ID,
-        text="🤖 *Scheduled Task:* Starting automatic bulk update (Mon/Wed)...",
+        text=(
+            "🤖 *Scheduled Task:* Resuming interrupted bulk update..."
+            if resuming
+            else "🤖 *Scheduled Task:* Starting automatic bulk update (Mon/Wed)..."
+        ),
         parse_mode=constants.ParseMode.MARKDOWN,
     )
     add_message(ADMIN_ID, msg_start.message_id)
 
-    cats, items = await run_bulk_logic(context)
+    report = await run_bulk_logic(context)
 
     # Notify admin that it finished
     msg_end = await context.bot.send_message(
         chat_id=ADMIN_ID,
-        text=f"✅ *Auto Bulk Finished*\nProcessed {cats} categories and {items} products.",
+        text=format_bulk_report("Auto Bulk Finished", report),
         parse_mode=constants.ParseMode.MARKDOWN,
     )
     add_message(ADMIN_ID, msg_end.message_id)
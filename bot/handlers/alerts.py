@@ -1,11 +1,15 @@
-import asyncio
 import datetime
+from collections import defaultdict
 
 from telegram import CallbackQuery, Update, constants
 from telegram.ext import ContextTypes
 
-from api.supermarket import get_product_price
-from db.repositories.favorites_repo import get_user_favorites
+from api.supermarket import (
+    PRIORITY_BACKGROUND,
+    get_many_product_prices,
+    get_product_price,
+)
+from db.repositories.favorites_repo import get_user_favorites, update_favorite_prices
 
 # Updated import: changed add_price_history_record to add_price_entry
 from db.repositories.history_repo import add_price_entry, get_product_history
@@ -14,10 +18,13 @@ from db.repositories.user_repo import (
     toggle_notifications,
 )
 from db.supabase_client import supabase
+from services.broadcast import broadcast
+from utils.helpers import split_message
 from utils.menu import main_menu_keyboard
 from utils.message_cache import add_message
 
 CURRENCY = "€"
+PRICE_UPDATE_CONCURRENCY = 5
 
 # ==============================
 # CALLBACK HANDLERS
@@ -75,41 +82,69 @@ async def global_price_update(context: ContextTypes.DEFAULT_TYPE):
     if not favorites:
         return
 
+    # One API lookup per product, shared by every subscriber of that product
+    groups = defaultdict(list)
     for fav in favorites:
-        product_id = fav.get("product_id")
-        user_id = fav.get("user_id")
+        groups[(fav.get("name"), fav.get("store"))].append(fav)
 
-        old_price = float(fav.get("price_eur") or fav.get("price") or 0)
-        fresh_data = get_product_price(fav.get("name"))  # Use name for search
+    fresh = await get_many_product_prices(
+        [name for name, _ in groups if name],
+        priority=PRIORITY_BACKGROUND,
+        concurrency=PRICE_UPDATE_CONCURRENCY,
+    )
 
-        if not fresh_data:
+    outbox = []
+    pending_prices = []
+    for (name, store), subscribers in groups.items():
+        results = fresh.get(name)
+        if not results:
             continue
 
-        # Handle potential multiple results from API
-        if isinstance(fresh_data, list):
-            fresh_data = fresh_data[0]
-
+        # Prefer the same store; fall back to the top result as before
+        fresh_data = next((r for r in results if r.get("store") == store), results[0])
         new_price = float(fresh_data.get("price_eur") or fresh_data.get("price") or 0)
 
-        if new_price < old_price:
+        for fav in subscribers:
+            user_id = fav.get("user_id")
+            old_price = float(fav.get("price_eur") or fav.get("price") or 0)
+            if new_price >= old_price:
+                continue
+
             diff = old_price - new_price
             message = (
                 f"📉 *Price Drop Alert!*\n"
-                f"🛒 *{fav.get('name')}*\n"
+                f"🛒 *{name}*\n"
                 f"💰 Was: {old_price:.2f}€\n"
                 f"✅ Now: **{new_price:.2f}€**\n"
                 f"💸 Saved: {diff:.2f}€"
             )
+            outbox.append((user_id, message))
+            pending_prices.append((user_id, fav.get("id"), new_price))
+
+    report = await broadcast(context.bot, outbox, label="Price drop alerts")
+
+    # Only favorites whose alert went out get the new price, as before
+    new_prices = {
+        fav_id: price
+        for user_id, fav_id, price in pending_prices
+        if user_id not in report["failed_chats"]
+    }
+
+    # Batched: one update per distinct new price
+    update_favorite_prices(new_prices)
 
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id, text=message, parse_mode="Markdown"
-                )
-                supabase.table("favorites").update({"price_eur": new_price}).eq(
-                    "id", fav.get("id")
-                ).execute()
-            except Exception as e:
-                print(f"Failed to send alert to {user_id}: {e}")
+
+def _digest_outbox(rows: list, header: str, render) -> list[tuple[int, str]]:
+    """One message per user (split at Telegram's limit) instead of one per row."""
+    by_user = defaultdict(list)
+    for item in rows:
+        by_user[item.get("user_id")].append(render(item))
+
+    return [
+        (user_id, part)
+        for user_id, blocks in by_user.items()
+        for part in split_message(header, blocks)
+    ]
 
 
 async def check_expiring_alerts(context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -128,20 +163,16 @@ async def check_expiring_alerts(context: ContextTypes.DEFAULT_TYPE) -> None:
         )
         if not response.data:
             return
-        for item in response.data:
-            user_id = item.get("user_id")
-            msg = (
-                f"⚠️ *Last Chance!*\n"
-                f"The promotion for *{item['name']}* ends **today**!\n"
+        outbox = _digest_outbox(
+            response.data,
+            "⚠️ *Last Chance!*\nThese promotions end **today**:\n\n",
+            lambda item: (
+                f"🛒 *{item['name']}*\n"
                 f"💰 Price: {item['price_eur']:.2f}€\n"
                 f"🏬 Store: {item.get('store', 'N/A')}"
-            )
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id, text=msg, parse_mode="Markdown"
-                )
-            except Exception as e:
-                print(f"Failed to send expiring alert to {user_id}: {e}")
+            ),
+        )
+        await broadcast(context.bot, outbox, label="Expiring today alerts")
     except Exception as e:
         print(f"Supabase Expiring Alerts Error: {e}")
 
@@ -162,19 +193,13 @@ async def check_expiring_tomorrow_alerts(context: ContextTypes.DEFAULT_TYPE) ->
         )
         if not response.data:
             return
-        for item in response.data:
-            user_id = item.get("user_id")
-            msg = (
-                f"🔔 *Reminder: Deal Ending Soon*\n"
-                f"The promotion for *{item['name']}* expires **tomorrow**.\n"
-                f"🏬 Store: {item.get('store', 'N/A')}"
-            )
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id, text=msg, parse_mode="Markdown"
-                )
-            except Exception as e:
-                print(f"Failed to send tomorrow alert to {user_id}: {e}")
+        outbox = _digest_outbox(
+            response.data,
+            "🔔 *Reminder: Deals Ending Soon*\n"
+            "These promotions expire **tomorrow**:\n\n",
+            lambda item: f"🛒 *{item['name']}*\n🏬 Store: {item.get('store', 'N/A')}",
+        )
+        await broadcast(context.bot, outbox, label="Expiring tomorrow alerts")
     except Exception as e:
         print(f"Supabase Tomorrow Alerts Error: {e}")
 
@@ -205,8 +230,8 @@ async def update_favorites_prices(
 
     for p in fav_list:
         pid = str(p.get("product_id"))
-        new_results = get_product_price(p["name"], multiple=True)
-        await asyncio.sleep(1.2)
+        # Pacing is handled by the shared API limiter
+        new_results = await get_product_price(p["name"], multiple=True)
 
         if not new_results:
             continue
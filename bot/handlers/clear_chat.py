@@ -2,7 +2,12 @@ from telegram import Update, constants
 from telegram.ext import ContextTypes
 
 from utils.menu import main_menu_keyboard
-from utils.message_cache import add_message, clear_messages, get_messages
+from utils.message_cache import (
+    add_message,
+    clear_messages,
+    get_messages,
+    prune_expired_messages,
+)
 
 
 async def clear_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -13,8 +18,8 @@ async def clear_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if query:
         await query.answer("Cleaning up...")
 
-    # Get all stored message IDs
-    message_ids = get_messages(user_id)
+    # Get all message IDs that are still deletable (kept in memory)
+    message_ids = await get_messages(user_id)
 
     if message_ids:
         # Telegram allows deleting up to 100 messages at once
@@ -27,8 +32,8 @@ async def clear_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 # Fallback for old messages or already deleted ones
                 pass
 
-    # Wipe from local DB
-    clear_messages(user_id)
+    # Wipe from memory and the DB
+    await clear_messages(user_id)
 
     # Send confirmation and main menu
     text = "✨ *Chat cleared successfully!*"
@@ -57,3 +62,8 @@ async def clear_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Save the new menu message ID so it can be cleared next time
     add_message(user_id, msg.message_id)
+
+
+async def prune_message_cache_job(context: ContextTypes.DEFAULT_TYPE):
+    """Scheduled cleanup of message ids older than Telegram's 48h delete window."""
+    await prune_expired_messages()
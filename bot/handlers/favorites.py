@@ -50,7 +50,7 @@ async def render_favorites_text(favorites: dict) -> str:
             saved_price = float(product.get("price_eur") or product.get("price") or 0)
             unit = product.get("quantity") or product.get("unit", "")
 
-            fresh_results = get_product_price(name, multiple=True) or []
+            fresh_results = await get_product_price(name, multiple=True) or []
             current_match = next(
                 (
                     item
@@ -0,0 +1,79 @@
+from telegram import (
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    Update,
+    constants,
+)
+from telegram.ext import ContextTypes
+
+from api.supermarket import normalize_query
+from services.cache import TTLCache
+from services.product_index import get_product_index
+from services.search_index import get_search_index
+
+CURRENCY = "€"
+INLINE_PAGE_SIZE = 20  # Telegram accepts at most 50 results per answer
+INLINE_MAX_RESULTS = 100
+INLINE_CACHE_TIME = 60  # seconds Telegram may reuse an answer on its side
+
+# Ranked product entries per normalized query, shared by all users and pages
+_inline_cache = TTLCache(maxsize=512, ttl=INLINE_CACHE_TIME)
+
+
+def _ranked_entries(query: str) -> list[dict]:
+    entries = _inline_cache.get(query)
+    if entries is None:
+        ids, _ = get_search_index().search(query, limit=INLINE_MAX_RESULTS)
+        entries = get_product_index().get_entries(ids)
+        _inline_cache.set(query, entries)
+    return entries
+
+
+def _to_article(entry: dict) -> InlineQueryResultArticle:
+    unit = entry.get("unit") or ""
+    unit_price = ""
+    if entry.get("unit_price"):
+        unit_price = f"⚖️ {entry['unit_price']:.2f}{CURRENCY}/{entry['base_unit']}\n"
+
+    text = (
+        f"🛒 *{entry['name']}*\n"
+        f"💰 Price: **{entry['price']:.2f}{CURRENCY}** ({unit})\n"
+        f"{unit_price}🏬 Store: {entry['store']}"
+    )
+    return InlineQueryResultArticle(
+        id=entry["id"],
+        title=entry["name"],
+        description=f"{entry['price']:.2f}{CURRENCY} ({unit}) • {entry['store']}",
+        input_message_content=InputTextMessageContent(
+            text, parse_mode=constants.ParseMode.MARKDOWN
+        ),
+    )
+
+
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Answers `@bot <product>` from the in-memory indexes only. The price API
+    is never called here, so answers stay inside Telegram's inline timeout.
+    """
+    inline_query = update.inline_query
+    query = normalize_query(inline_query.query)
+    if len(query) < 2:
+        await inline_query.answer([], cache_time=INLINE_CACHE_TIME)
+        return
+
+    try:
+        offset = int(inline_query.offset or 0)
+    except ValueError:
+        offset = 0
+
+    entries = _ranked_entries(query)
+    page = entries[offset : offset + INLINE_PAGE_SIZE]
+    next_offset = offset + INLINE_PAGE_SIZE
+    try:
+        await inline_query.answer(
+            [_to_article(entry) for entry in page],
+            cache_time=INLINE_CACHE_TIME,
+            next_offset=str(next_offset) if next_offset < len(entries) else "",
+        )
+    except Exception as e:
+        print(f"Inline Answer Error: {e}")
@@ -1,10 +1,19 @@
+import asyncio
+import secrets
 from datetime import datetime
 
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, constants
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InputMediaPhoto,
+    Update,
+    constants,
+)
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes, ConversationHandler
 
-from api.supermarket import get_product_price
-from db.repositories.history_repo import add_price_entry, get_product_history
+from api.supermarket import PRIORITY_BACKGROUND, get_product_price
+from db.repositories.history_repo import add_price_entries, get_previous_prices
 from db.repositories.user_repo import (
     FREE_USER_DAILY_LIMIT,
     can_user_make_request,
@@ -12,6 +21,10 @@ from db.repositories.user_repo import (
     increment_request_count,
     is_user_premium,
 )
+from services.cache import refresh_in_background
+from services.catalog import upsert_products
+from services.search_index import search_products
+from utils.file_id_cache import send_cached_photo
 from utils.helpers import calculate_unit_price, get_product_id
 from utils.menu import main_menu_keyboard
 from utils.message_cache import add_message
@@ -20,6 +33,138 @@ SEARCH_INPUT = 1
 CURRENCY = "€"
 
 
+async def _revalidate_search(query: str) -> None:
+    """Refreshes a stale search_cache row without blocking the user."""
+    from db.repositories.cache_repo import set_cache_results
+
+    products = await get_product_price(
+        query, multiple=True, priority=PRIORITY_BACKGROUND
+    )
+    if products:
+        set_cache_results(query, products)
+        await asyncio.to_thread(upsert_products, products)
+
+
+def _page_keyboard(pages: list[dict], index: int, token: str) -> InlineKeyboardMarkup:
+    product_id = pages[index]["product_id"]
+    rows = [
+        [
+            InlineKeyboardButton(
+                "⭐ Add to Favorites",
+                callback_data=f"add_favorite_{product_id}",
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                "🛒 Add to Cart", callback_data=f"add_shopping_{product_id}"
+            )
+        ],
+        [
+            InlineKeyboardButton(
+                "📈 Price History", callback_data=f"price_history_{product_id}"
+            )
+        ],
+    ]
+    if len(pages) > 1:
+        rows.append(
+            [
+                InlineKeyboardButton(
+                    "◀️ Prev",
+                    callback_data=f"search_page_{token}_{(index - 1) % len(pages)}",
+                ),
+                InlineKeyboardButton(f"{index + 1}/{len(pages)}", callback_data="none"),
+                InlineKeyboardButton(
+                    "Next ▶️",
+                    callback_data=f"search_page_{token}_{(index + 1) % len(pages)}",
+                ),
+            ]
+        )
+    return InlineKeyboardMarkup(rows)
+
+
+async def _send_page(message, pages: list[dict], index: int, token: str):
+    """Sends one result page as a reply to `message`."""
+    page = pages[index]
+    keyboard = _page_keyboard(pages, index, token)
+    if page["image"]:
+        try:
+            return await send_cached_photo(
+                page["image"],
+                lambda photo: message.reply_photo(
+                    photo,
+                    caption=page["caption"],
+                    reply_markup=keyboard,
+                    parse_mode=constants.ParseMode.MARKDOWN,
+                ),
+            )
+        except TelegramError as e:
+            # Broken image URL, upload timeout: still show the product as text
+            print(f"Error sending photo: {e}")
+    return await message.reply_text(
+        page["caption"],
+        reply_markup=keyboard,
+        parse_mode=constants.ParseMode.MARKDOWN,
+    )
+
+
+async def search_page_callback(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    """Prev/Next: swaps the result message in place instead of sending more."""
+    query = update.callback_query
+    user_id = query.from_user.id
+    pages = context.user_data.get("search_pages") or []
+    token, index = query.data.removeprefix("search_page_").split("_")
+    index = int(index)
+
+    # Buttons of an older search carry its token; the pages are gone
+    if token != context.user_data.get("search_token") or index >= len(pages):
+        await query.answer("⌛ These results expired, please search again.")
+        return
+    await query.answer()
+
+    page = pages[index]
+    keyboard = _page_keyboard(pages, index, token)
+    try:
+        if page["image"] and query.message.photo:
+            await send_cached_photo(
+                page["image"],
+                lambda photo: query.edit_message_media(
+                    InputMediaPhoto(
+                        photo,
+                        caption=page["caption"],
+                        parse_mode=constants.ParseMode.MARKDOWN,
+                    ),
+                    reply_markup=keyboard,
+                ),
+            )
+        elif not page["image"] and not query.message.photo:
+            await query.edit_message_text(
+                page["caption"],
+                reply_markup=keyboard,
+                parse_mode=constants.ParseMode.MARKDOWN,
+            )
+        else:
+            # Telegram cannot turn a text message into a photo or back
+            msg = await _send_page(query.message, pages, index, token)
+            add_message(user_id, msg.message_id)
+            await query.message.delete()
+    except Exception as e:
+        print(f"Error switching search page: {e}")
+
+
+def _limit_text(user_id: int) -> str:
+    status = get_user_subscription_status(user_id)
+    current_count = status.get("daily_request_count", 0) if status else 0
+
+    # Note: We use FREE_USER_DAILY_LIMIT (20) here
+    return (
+        f"🚫 *Limit Reached!* "
+        f"({min(current_count, FREE_USER_DAILY_LIMIT)}/{FREE_USER_DAILY_LIMIT})\n\n"
+        f"Unlock *Unlimited* searches and Premium features for only 2.50 EUR! 🚀"
+    )
+
+
 async def search_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Initializes the search process and checks limits only for non-premium users."""
     user_id = update.effective_user.id
@@ -31,14 +176,7 @@ async def search_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
     # 2. LIMIT CHECK: Only for free users
     elif not can_user_make_request(user_id):
-        status = get_user_subscription_status(user_id)
-        current_count = status.get("daily_request_count", 0) if status else 0
-
-        # Note: We use FREE_USER_DAILY_LIMIT (20) here
-        limit_text = (
-            f"🚫 *Limit Reached!* ({current_count}/{FREE_USER_DAILY_LIMIT})\n\n"
-            f"Unlock *Unlimited* searches and Premium features for only 2.50 EUR! 🚀"
-        )
+        limit_text = _limit_text(user_id)
 
         if update.callback_query:
             await update.callback_query.answer(
@@ -83,21 +221,42 @@ async def search_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
     add_message(user_id, update.message.message_id)
 
-    from db.repositories.cache_repo import get_cached_results, set_cache_results
+    from db.repositories.cache_repo import get_cached_entry, set_cache_results
 
-    # 1. Data Retrieval
-    products = get_cached_results(user_input, expiry_hours=24)
+    # Free users: count the search and check the limit in one atomic call, so
+    # prompts opened in parallel cannot all slip past the check in search_start
+    is_premium = is_user_premium(user_id)
+    if not is_premium and not increment_request_count(user_id):
+        msg = await update.message.reply_text(
+            _limit_text(user_id), parse_mode=constants.ParseMode.MARKDOWN
+        )
+        add_message(user_id, msg.message_id)
+        return ConversationHandler.END
+
+    # 1. Data Retrieval (stale rows are served and refreshed in the background)
+    products, is_stale = get_cached_entry(user_input, expiry_hours=24)
     is_cached = True
+    is_local = False
+
+    if products and is_stale:
+        refresh_in_background(
+            ("search", user_input), lambda: _revalidate_search(user_input)
+        )
 
+    # Local catalog: typo-, prefix- and script-tolerant, no API quota spent
     if not products:
-        products = get_product_price(user_input, multiple=True)
+        products = await asyncio.to_thread(search_products, user_input)
+        is_local = bool(products)
+
+    if not products:
+        products = await get_product_price(user_input, multiple=True)
         is_cached = False
         if products:
             set_cache_results(user_input, products)
+            await asyncio.to_thread(upsert_products, products)
 
-    # 2. Limit Logic
-    is_premium = is_user_premium(user_id)
-    if not is_premium or not is_cached:
+    # 2. Limit Logic: premium users are only counted for fresh API data
+    if is_premium and not is_cached:
         increment_request_count(user_id)
 
     if not products:
@@ -106,6 +265,7 @@ async def search_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         return ConversationHandler.END
 
     # 3. Unit Price Calculation & Global History Logging
+    history_records = []
     for p in products:
         # Calculate pricing details
         price_val = p.get("price_eur") or p.get("price")
@@ -124,15 +284,23 @@ async def search_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         )
 
         # MANDATORY LOGGING: Save every product returned by API to history
-        add_price_entry(
-            product_id=prod_id,
-            name=p.get("name", "N/A"),
-            store=curr_store,
-            price=float(price_val) if price_val else 0.0,
-            unit_price=u_price,
-            base_unit=u_unit,
+        history_records.append(
+            {
+                "product_id": prod_id,
+                "name": p.get("name", "N/A"),
+                "store": curr_store,
+                "price": float(price_val) if price_val else 0.0,
+                "unit_price": u_price,
+                "base_unit": u_unit,
+            }
         )
 
+    # One multi-row upsert instead of one request per product. Only fresh API
+    # data is logged: cached and catalog rows may be days old and would be
+    # recorded under today's date
+    if not is_cached:
+        await asyncio.to_thread(add_price_entries, history_records)
+
     # 4. Sorting for UI
     products.sort(
         key=lambda x: (
@@ -141,8 +309,14 @@ async def search_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     )
     cheapest_unit_val = products[0]["calc_unit_price"] if products else None
 
-    # 5. UI Rendering Loop
+    # Previous prices for all trend arrows in a single query
+    previous_prices = await asyncio.to_thread(
+        get_previous_prices, [get_product_id(p) for p in products]
+    )
+
+    # 5. UI Rendering Loop: one page per product, shown in a single message
     search_results = {}
+    search_pages = []
     for p in products:
         product_id = get_product_id(p)
         promo_timer = ""
@@ -176,12 +350,11 @@ async def search_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         curr_unit = p.get("quantity") or p.get("unit", "")
         curr_image = p.get("image_url") or p.get("image")
 
-        # Fetch history for trend visualization
-        history = get_product_history(product_id)
+        # Trend visualization against the previous recorded day
+        prev_price = previous_prices.get(product_id)
         trend_text = ""
-        if history and len(history) > 1:
+        if prev_price is not None:
             try:
-                prev_price = float(history[1]["price"])
                 if curr_price < prev_price:
                     diff = prev_price - curr_price
                     trend_text = f"📉 *Price drop!* (was {prev_price:.2f}{CURRENCY}, saved {diff:.2f}{CURRENCY})\n"
@@ -209,50 +382,38 @@ async def search_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         if p.get("discount"):
             caption += f"💸 Discount: {p['discount']}%\n"
 
-        keyboard = InlineKeyboardMarkup(
-            [
-                [
-                    InlineKeyboardButton(
-                        "⭐ Add to Favorites",
-                        callback_data=f"add_favorite_{product_id}",
-                    )
-                ],
-                [
-                    InlineKeyboardButton(
-                        "🛒 Add to Cart", callback_data=f"add_shopping_{product_id}"
-                    )
-                ],
-                [
-                    InlineKeyboardButton(
-                        "📈 Price History", callback_data=f"price_history_{product_id}"
-                    )
-                ],
-            ]
+        search_pages.append(
+            {"product_id": product_id, "caption": caption, "image": curr_image}
         )
 
-        try:
-            if curr_image:
-                msg = await update.message.reply_photo(
-                    curr_image,
-                    caption=caption,
-                    reply_markup=keyboard,
-                    parse_mode=constants.ParseMode.MARKDOWN,
-                )
-            else:
-                msg = await update.message.reply_text(
-                    caption,
-                    reply_markup=keyboard,
-                    parse_mode=constants.ParseMode.MARKDOWN,
-                )
-            add_message(user_id, msg.message_id)
-        except Exception as e:
-            print(f"Error sending message: {e}")
-            continue
-
     context.user_data["search_results"] = search_results
-    status_label = " (cloud cache)" if is_cached else " (fresh data)"
+    # A new token per search, so Prev/Next on older result messages cannot
+    # page through these results
+    token = secrets.token_hex(4)
+    context.user_data["search_pages"] = search_pages
+    context.user_data["search_token"] = token
+    try:
+        msg = await _send_page(update.message, search_pages, 0, token)
+        add_message(user_id, msg.message_id)
+    except Exception as e:
+        print(f"Error sending message: {e}")
+        msg = await update.message.reply_text(
+            "⚠️ Could not show the results, please try again.",
+            reply_markup=main_menu_keyboard(user_id),
+        )
+        add_message(user_id, msg.message_id)
+        return ConversationHandler.END
+
+    if not is_cached:
+        status_label = " (fresh data)"
+    elif is_local:
+        status_label = " (local catalog)"
+    elif is_stale:
+        status_label = " (cloud cache, stale - refreshing)"
+    else:
+        status_label = " (cloud cache)"
     final_msg = await update.message.reply_text(
-        f"✅ *Search completed!*{status_label}",
+        f"✅ *Search completed!* {len(search_pages)} results{status_label}",
         reply_markup=main_menu_keyboard(user_id),
         parse_mode=constants.ParseMode.MARKDOWN,
     )
@@ -3,7 +3,7 @@ from typing import Any
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, constants
 from telegram.ext import ContextTypes
 
-from db.repositories.cache_repo import get_all_cached_products
+from config.settings import OPTIMIZER_MAX_STORES
 from db.repositories.shopping_repo import (
     add_to_shopping_list as add_to_shopping,
 )
@@ -14,6 +14,8 @@ from db.repositories.shopping_repo import (
     get_user_shopping_list as get_shopping_list,
 )
 from db.repositories.user_repo import is_user_premium
+from services.cart_optimizer import optimize_cart
+from services.product_index import get_keywords, get_product_index
 from utils.helpers import calculate_unit_price
 from utils.menu import main_menu_keyboard
 from utils.message_cache import add_message  # Внедрена логика
@@ -28,8 +30,7 @@ def get_better_price(
     current_store: str,
     current_item: dict[str, Any],
 ) -> dict[str, Any] | None:
-    """Analyzes Supabase cloud cache to find better deals using unit prices."""
-    all_cached_results = get_all_cached_products()
+    """Looks up better deals by unit price in the in-memory product index."""
     better_option = None
 
     curr_u_price, _ = calculate_unit_price(
@@ -40,54 +41,41 @@ def get_better_price(
         return None
 
     min_unit_price = curr_u_price
-    # Keeping your original ignore list
-    ignore_words = {
-        "pilos",
-        "саяна",
-        "lidl",
-        "kaufland",
-        "billa",
-        "боженци",
-        "vereia",
-        "верея",
-    }
-    keywords = [
-        w for w in product_name.lower().split() if w not in ignore_words and len(w) > 2
-    ]
-
-    for products in all_cached_results:
-        for p in products:
-            p_name_lower = p.get("name", "").lower()
-            match_count = sum(1 for word in keywords if word in p_name_lower)
-
-            if match_count >= 2:
-                try:
-                    p_price = float(p.get("price_eur") or p.get("price", 0))
-                    p_unit = p.get("quantity") or p.get("unit")
-                    supermarket = p.get("supermarket")
-                    p_store = (
-                        supermarket.get("name")
-                        if isinstance(supermarket, dict)
-                        else p.get("store", "Unknown")
-                    )
-                    p_u_price, _ = calculate_unit_price(p_price, p_unit)
-
-                    if (
-                        p_u_price
-                        and p_store != current_store
-                        and p_u_price < min_unit_price
-                    ):
-                        min_unit_price = p_u_price
-                        better_option = {
-                            "price": p_price,
-                            "unit": p_unit,
-                            "store": p_store,
-                        }
-                except (ValueError, TypeError, KeyError):
-                    continue
+    keywords = get_keywords(product_name)
+
+    # Only products sharing at least two keywords are considered
+    for p in get_product_index().candidates(keywords):
+        p_u_price = p["unit_price"]
+        if p_u_price and p["store"] != current_store and p_u_price < min_unit_price:
+            min_unit_price = p_u_price
+            better_option = {
+                "price": p["price"],
+                "unit": p["unit"],
+                "store": p["store"],
+            }
     return better_option
 
 
+def optimizer_summary(shopping: list[dict[str, Any]]) -> list[str]:
+    """Report lines for the cheapest store assignment of the whole cart."""
+    plan = optimize_cart(shopping, OPTIMIZER_MAX_STORES)
+    if not plan or plan["saving"] <= 0:
+        return []
+
+    limit = f" (max {OPTIMIZER_MAX_STORES} stores)" if OPTIMIZER_MAX_STORES else ""
+    lines = [f"\n🧠 *Optimal Plan{limit}:* {', '.join(plan['stores'])}"]
+    for step in plan["assignment"]:
+        if step["offer"] is None:
+            continue
+        name = step["item"].get("name", "Unknown")
+        lines.append(f"• {name[:30]} → {step['store']} ({step['cost']:.2f}{CURRENCY})")
+    lines.append(
+        f"💰 *Plan Total: {plan['total']:.2f}{CURRENCY}* "
+        f"(save {plan['saving']:.2f}{CURRENCY})"
+    )
+    return lines
+
+
 async def safe_edit(
     query, text: str, reply_markup: InlineKeyboardMarkup = None
 ) -> None:
@@ -187,6 +175,9 @@ async def list_shopping(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     for store, s_sum in store_totals.items():
         summary.append(f"• {store}: {s_sum:.2f}{CURRENCY}")
 
+    if is_premium:
+        summary.extend(optimizer_summary(shopping))
+
     report_lines.extend(summary)
     keyboard.append(
         [InlineKeyboardButton("🧹 Clear Cart", callback_data="confirm_clear")]
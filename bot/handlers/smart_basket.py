@@ -1,23 +1,38 @@
+import asyncio
 import datetime
+import time
 
 import pytz
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, constants
 from telegram.ext import ContextTypes, ConversationHandler
 
-from api.supermarket import get_product_price
+from api.supermarket import (
+    PRIORITY_BACKGROUND,
+    get_many_product_prices,
+    get_product_price,
+)
 from db.repositories.smart_basket_repo import (
     delete_user_basket,
     get_baskets_by_time,
     get_user_basket,
-    update_last_prices,
+    update_last_prices_bulk,
     update_smart_basket,
 )
-from db.repositories.user_repo import get_user_subscription_status, is_user_premium
+from db.repositories.user_repo import get_users_status_bulk, is_user_premium
+from services.broadcast import broadcast
+from services.search_index import CATALOG_MAX_AGE, search_products
+from utils.file_id_cache import send_cached_photo
 from utils.helpers import calculate_unit_price, get_product_id
 from utils.message_cache import add_message
 
 # Configuration
 SB_LIMIT = 20
+SB_MATCH_CONCURRENCY = 5
+SB_JOB_CONCURRENCY = 5
+# Catalog rows from the same day's 04:00 bulk crawl are recent enough for
+# the 09:00 and 18:00 price checks; older ones are re-fetched from the API
+SB_JOB_CATALOG_MAX_AGE = datetime.timedelta(hours=15)
+PROGRESS_EDIT_INTERVAL = 1.0  # seconds between "Matching items" edits
 SB_TIME, SB_INPUT, SB_REVIEW, SB_CHANGE_SEARCH, SB_SELECT_REPLACEMENT = range(5)
 
 
@@ -155,6 +170,31 @@ async def handle_time_selection(update: Update, context: ContextTypes.DEFAULT_TY
     return SB_INPUT
 
 
+async def _find_products(
+    queries: list[str], max_age: datetime.timedelta = CATALOG_MAX_AGE, **api_kwargs
+) -> dict[str, list]:
+    """
+    Matches queries against the local catalog first and sends only the misses
+    to get_many_product_prices (which receives `api_kwargs`, incl. on_result).
+    Results are keyed by query like get_many_product_prices.
+    """
+    unique = list(dict.fromkeys(queries))
+    local = await asyncio.to_thread(
+        lambda: {q: search_products(q, max_age=max_age) for q in unique}
+    )
+
+    results = {q: products for q, products in local.items() if products}
+    on_result = api_kwargs.get("on_result")
+    if on_result:
+        for query, products in results.items():
+            await on_result(query, products)
+
+    missing = [q for q in unique if q not in results]
+    if missing:
+        results.update(await get_many_product_prices(missing, **api_kwargs))
+    return results
+
+
 async def handle_sb_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if update.message:
@@ -173,9 +213,31 @@ async def handle_sb_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     processing = await update.message.reply_text("🔎 Matching items...")
     add_message(user_id, processing.message_id)
 
+    total = len(dict.fromkeys(raw_items))
+    progress = {"done": 0, "last_edit": 0.0}
+
+    async def report_progress(query: str, products: list) -> None:
+        progress["done"] += 1
+        now = time.monotonic()
+        # Telegram throttles edits, so refresh the counter at most once a second
+        if now - progress["last_edit"] < PROGRESS_EDIT_INTERVAL:
+            return
+        progress["last_edit"] = now
+        try:
+            await processing.edit_text(
+                f"🔎 Matching items... {progress['done']}/{total}"
+            )
+        except Exception:
+            pass
+
+    # Items are matched concurrently; the basket keeps the order of the input
+    results = await _find_products(
+        raw_items, concurrency=SB_MATCH_CONCURRENCY, on_result=report_progress
+    )
+
     matched = []
     for item in raw_items:
-        res = get_product_price(item, multiple=True)
+        res = results.get(item)
         if res:
             best = res[0]
             matched.append(
@@ -300,7 +362,7 @@ async def process_replacement_search(
         add_message(user_id, update.message.message_id)
 
     # 1. Try Live API
-    products = get_product_price(search_query, multiple=True)
+    products = await get_product_price(search_query, multiple=True)
     is_from_cache = False
     cache_date = "recently"
 
@@ -378,11 +440,14 @@ async def process_replacement_search(
 
         try:
             m = (
-                await update.message.reply_photo(
-                    p.get("image_url"),
-                    caption=cap,
-                    reply_markup=kb,
-                    parse_mode=constants.ParseMode.MARKDOWN,
+                await send_cached_photo(
+                    p["image_url"],
+                    lambda photo: update.message.reply_photo(
+                        photo,
+                        caption=cap,
+                        reply_markup=kb,
+                        parse_mode=constants.ParseMode.MARKDOWN,
+                    ),
                 )
                 if p.get("image_url")
                 else await update.message.reply_text(
@@ -433,21 +498,40 @@ async def finalize_replacement(update: Update, context: ContextTypes.DEFAULT_TYP
 
 
 async def smart_basket_job(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Checks every basket scheduled for this time slot. Each distinct product
+    name is looked up once (recent catalog rows first, then the API) and the
+    result is shared by all baskets holding it.
+    """
     now = datetime.datetime.now(pytz.timezone("Europe/Sofia")).strftime("%H:%M")
     baskets = get_baskets_by_time(now)
     if not baskets or not baskets.data:
         return
 
-    for b in baskets.data:
-        u_id = b["user_id"]
-        u_status = get_user_subscription_status(u_id)
-        if not u_status or not u_status.get("notifications_enabled", True):
-            continue
+    statuses = get_users_status_bulk([b["user_id"] for b in baskets.data])
+    active = [
+        b
+        for b in baskets.data
+        if statuses.get(b["user_id"])
+        and statuses[b["user_id"]].get("notifications_enabled", True)
+    ]
+    if not active:
+        return
 
+    names = [item["name"] for b in active for item in b["items"]]
+    fresh = await _find_products(
+        names,
+        max_age=SB_JOB_CATALOG_MAX_AGE,
+        priority=PRIORITY_BACKGROUND,
+        concurrency=SB_JOB_CONCURRENCY,
+    )
+
+    updated_baskets, outbox = [], []
+    for b in active:
         history_prices = b.get("last_prices") or {}
         new_prices, alerts = {}, []
         for item in b["items"]:
-            res = get_product_price(item["name"], multiple=True)
+            res = fresh.get(item["name"])
             if res:
                 match = res[0]
                 curr_p = float(match.get("price"))
@@ -458,14 +542,16 @@ async def smart_basket_job(context: ContextTypes.DEFAULT_TYPE):
                         f"📉 *{item['name']}*: *{curr_p}€* (was {old_p}€) @ {match['store']}"
                     )
 
-        update_last_prices(u_id, new_prices)
+        updated_baskets.append({"user_id": b["user_id"], "last_prices": new_prices})
         if alerts:
-            await context.bot.send_message(
-                u_id,
-                "🎁 *Smart Basket Price Drop!*\n\n" + "\n".join(alerts),
-                parse_mode="Markdown",
+            outbox.append(
+                (b["user_id"], "🎁 *Smart Basket Price Drop!*\n\n" + "\n".join(alerts))
             )
 
+    update_last_prices_bulk(updated_baskets)
+
+    await broadcast(context.bot, outbox, label="Smart Basket alerts")
+
 
 async def confirm_clear_basket(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
@@ -0,0 +1,17 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from db.repositories.user_repo import load_request_user
+
+
+async def load_user_context(update: object, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Runs before every other handler (group -1) and loads the user's row once,
+    so user_repo, the main menu and user badges share it for this update.
+    """
+    user = update.effective_user if isinstance(update, Update) else None
+    # Inline answers never read the row; skip the lookup to keep them fast
+    if user is None or update.inline_query:
+        load_request_user(None)
+        return
+    load_request_user(user.id)
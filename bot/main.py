@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import logging
 
@@ -9,12 +10,20 @@ from telegram.ext import (
     CommandHandler,
     ContextTypes,
     ConversationHandler,
+    InlineQueryHandler,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 
+from api.supermarket import close_clients
 from config.settings import TELEGRAM_TOKEN
-from handlers.admin_bulk import bulk_job_wrapper, bulk_products
+from handlers.admin_bulk import (
+    RESUME_JOB_NAME,
+    bulk_job_wrapper,
+    bulk_products,
+    has_unfinished_checkpoint,
+)
 from handlers.alerts import (
     check_expiring_alerts,
     check_expiring_tomorrow_alerts,
@@ -22,7 +31,7 @@ from handlers.alerts import (
     handle_toggle_alerts,
     update_favorites_prices,
 )
-from handlers.clear_chat import clear_chat
+from handlers.clear_chat import clear_chat, prune_message_cache_job
 from handlers.favorites import (
     add_to_favorite_callback,
     delete_favorite_callback,
@@ -30,8 +39,14 @@ from handlers.favorites import (
     view_price_history_callback,
 )
 from handlers.info import show_info
+from handlers.inline import inline_search
 from handlers.profile import view_profile_callback
-from handlers.search import SEARCH_INPUT, search_input, search_start
+from handlers.search import (
+    SEARCH_INPUT,
+    search_input,
+    search_page_callback,
+    search_start,
+)
 from handlers.shopping import (
     add_to_shopping_callback,
     clear_shopping_callback,
@@ -60,8 +75,11 @@ from handlers.smart_basket import (
     start_new_basket_flow,
 )
 from handlers.start import start
+from handlers.user_context import load_user_context
+from services.product_index import get_product_index
+from utils.file_id_cache import save_file_ids
 from utils.menu import main_menu_keyboard
-from utils.message_cache import add_message
+from utils.message_cache import add_message, flush_messages
 
 # Logging
 logging.basicConfig(
@@ -87,9 +105,32 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+async def on_startup(app: Application) -> None:
+    """
+    Loads the product index (local catalog + search_cache) before polling and
+    resumes a bulk run that a restart interrupted.
+    """
+    await asyncio.to_thread(get_product_index)
+    if has_unfinished_checkpoint():
+        app.job_queue.run_once(bulk_job_wrapper, when=60, name=RESUME_JOB_NAME)
+
+
+async def on_shutdown(app: Application) -> None:
+    """Flushes buffered writes and releases pooled resources when the bot stops."""
+    await flush_messages()
+    await asyncio.to_thread(save_file_ids)
+    await close_clients()
+
+
 def main():
     """Starts the Telegram bot with Scheduler."""
-    app = Application.builder().token(TELEGRAM_TOKEN).build()
+    app = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     # --- Job Queue (Automation) ---
     job_queue = app.job_queue
@@ -130,6 +171,11 @@ def main():
         days=(2,),
     )
 
+    job_queue.run_repeating(prune_message_cache_job, interval=3600, first=60)
+
+    # --- Per-update user context (runs before every other handler) ---
+    app.add_handler(TypeHandler(Update, load_user_context), group=-1)
+
     # --- Core Commands ---
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("update_prices", update_favorites_prices))
@@ -153,6 +199,11 @@ def main():
         allow_reentry=True,
     )
     app.add_handler(search_conv)
+    app.add_handler(
+        CallbackQueryHandler(
+            search_page_callback, pattern=r"^search_page_[0-9a-f]+_\d+$"
+        )
+    )
 
     # --- SMART BASKET ---
 
@@ -229,6 +280,9 @@ def main():
         CallbackQueryHandler(view_profile_callback, pattern="^view_profile$")
     )
 
+    # --- Inline mode (@bot <product>) ---
+    app.add_handler(InlineQueryHandler(inline_search))
+
     # --- BULK ---
     app.add_handler(CommandHandler("bulk_products", bulk_products))
 
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from collections import defaultdict
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from api.supermarket import TokenBucketLimiter
+
+# Telegram allows ~30 msg/s per bot and ~1 msg/s per chat; stay just below
+GLOBAL_RATE = 25
+PER_CHAT_INTERVAL = 1.0  # seconds
+MAX_CONCURRENCY = 10
+MAX_ATTEMPTS = 3
+
+# Shared by every job so overlapping broadcasts respect the same global limit
+_global_bucket = TokenBucketLimiter(GLOBAL_RATE, burst=GLOBAL_RATE)
+_last_sent: dict[int, float] = {}
+
+
+async def _wait_for_chat(chat_id: int) -> None:
+    wait = _last_sent.get(chat_id, 0.0) + PER_CHAT_INTERVAL - time.monotonic()
+    if wait > 0:
+        await asyncio.sleep(wait)
+    await _global_bucket.acquire()
+    _last_sent[chat_id] = time.monotonic()
+
+
+async def _send_one(bot, chat_id: int, text: str, parse_mode: str, report: dict):
+    for attempt in range(MAX_ATTEMPTS):
+        await _wait_for_chat(chat_id)
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+            report["delivered"] += 1
+            return
+        except RetryAfter as e:
+            # Flood control: Telegram tells us exactly how long to back off
+            delay = float(e.retry_after)
+        except (Forbidden, BadRequest) as e:
+            # Blocked bot, deleted chat, bad markup: retrying will not help
+            print(f"Delivery to {chat_id} failed: {e}")
+            break
+        except NetworkError as e:
+            print(f"Delivery to {chat_id} hit a network error: {e}")
+            delay = 2**attempt
+        except Exception as e:
+            # Anything else (ChatMigrated, a bug) fails this chat, not the batch
+            print(f"Delivery to {chat_id} failed unexpectedly: {e}")
+            break
+
+        if attempt + 1 < MAX_ATTEMPTS:
+            report["retried"] += 1
+            await asyncio.sleep(delay)
+
+    report["failed"] += 1
+    report["failed_chats"].add(chat_id)
+
+
+async def broadcast(
+    bot,
+    messages: list[tuple[int, str]],
+    parse_mode: str = "Markdown",
+    label: str = "broadcast",
+) -> dict:
+    """
+    Delivers (chat_id, text) pairs under a global token bucket, per-chat
+    pacing and bounded concurrency, retrying on RetryAfter and network errors.
+    Messages to the same chat keep their order.
+    Returns delivered/retried/failed counts and the set of failed chats.
+    """
+    report = {"delivered": 0, "retried": 0, "failed": 0, "failed_chats": set()}
+    if not messages:
+        return report
+
+    by_chat = defaultdict(list)
+    for chat_id, text in messages:
+        by_chat[chat_id].append(text)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def deliver_chat(chat_id: int, texts: list[str]) -> None:
+        async with semaphore:
+            for text in texts:
+                await _send_one(bot, chat_id, text, parse_mode, report)
+
+    results = await asyncio.gather(
+        *(deliver_chat(c, t) for c, t in by_chat.items()), return_exceptions=True
+    )
+    for chat_id, result in zip(by_chat, results):
+        if isinstance(result, BaseException):
+            print(f"Delivery to {chat_id} aborted: {result}")
+            report["failed_chats"].add(chat_id)
+
+    # Forget pacing state that no longer matters
+    cutoff = time.monotonic() - PER_CHAT_INTERVAL
+    for chat_id in [c for c, sent in _last_sent.items() if sent < cutoff]:
+        del _last_sent[chat_id]
+
+    print(
+        f"📬 {label}: delivered {report['delivered']}, "
+        f"retried {report['retried']}, failed {report['failed']}"
+    )
+    return report
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+_MISSING = object()
+
+# Background refreshes currently running, at most one per key
+_refreshing: dict[Any, asyncio.Task] = {}
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with LRU eviction and a per-entry TTL.
+    Not thread-safe; meant to be used from the bot's event loop.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key, _MISSING, record=False) is not _MISSING
+
+    def get(self, key: Any, default: Any = None, record: bool = True) -> Any:
+        """Returns the value and marks it most recently used."""
+        entry = self._data.get(key)
+        if entry is None:
+            if record:
+                self._misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self._expirations += 1
+            if record:
+                self._misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        if record:
+            self._hits += 1
+        return value
+
+    def set(self, key: Any, value: Any, ttl: float | None = None) -> None:
+        """Stores a value, evicting the least recently used entry when full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._evictions += 1
+
+    def delete(self, key: Any) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+        }
+
+
+def refresh_in_background(key: Any, refresh: Callable[[], Awaitable[Any]]) -> bool:
+    """
+    Schedules `refresh()` on the running loop unless one is already running
+    for the same key. Returns True if a new refresh was started.
+    """
+    if key in _refreshing:
+        return False
+
+    task = asyncio.get_running_loop().create_task(refresh())
+    _refreshing[key] = task
+    task.add_done_callback(lambda t: _finish_refresh(key, t))
+    return True
+
+
+def _finish_refresh(key: Any, task: asyncio.Task) -> None:
+    _refreshing.pop(key, None)
+    if not task.cancelled() and task.exception():
+        print(f"Background refresh failed for {key!r}: {task.exception()}")
@@ -0,0 +1,98 @@
+from itertools import combinations
+from typing import Any
+
+from config.settings import OPTIMIZER_MAX_STORES
+from services.product_index import get_keywords, get_product_index, store_of
+from utils.helpers import calculate_unit_price
+
+
+def _item_price(item: dict[str, Any]) -> float:
+    return float(item.get("price_eur") or item.get("price") or 0)
+
+
+def _item_options(item: dict[str, Any], index) -> dict[str, tuple[float, dict | None]]:
+    """
+    Cheapest way to buy one cart item in every store: store -> (cost, offer).
+    The item's own store is always an option at its current price; other
+    offers are scaled by unit price to the same amount of product.
+    """
+    price = _item_price(item)
+    options = {store_of(item): (price, None)}
+
+    unit_price, base_unit = calculate_unit_price(
+        price, item.get("quantity") or item.get("unit")
+    )
+    if not unit_price:
+        return options
+
+    amount = price / unit_price
+    for offer in index.candidates(get_keywords(item.get("name", ""))):
+        if not offer["unit_price"] or offer["base_unit"] != base_unit:
+            continue
+        cost = round(offer["unit_price"] * amount, 2)
+        if cost < options.get(offer["store"], (float("inf"),))[0]:
+            options[offer["store"]] = (cost, offer)
+    return options
+
+
+def _store_sets(stores: list[str], max_stores: int):
+    if max_stores <= 0 or max_stores >= len(stores):
+        yield tuple(stores)
+        return
+    for size in range(1, max_stores + 1):
+        yield from combinations(stores, size)
+
+
+def optimize_cart(
+    items: list[dict[str, Any]], max_stores: int = OPTIMIZER_MAX_STORES
+) -> dict[str, Any] | None:
+    """
+    Cheapest assignment of cart items to stores, visiting at most `max_stores`
+    stores (0 = any number). Enumerates store subsets, which stays cheap
+    because there are only a handful of supermarkets.
+    Returns None when no allowed set of stores can supply the whole cart.
+    """
+    if not items:
+        return None
+
+    index = get_product_index()
+    options = [_item_options(item, index) for item in items]
+    # What the cart costs as saved, not the cheapest offer in the same store
+    current_total = sum(_item_price(item) for item in items)
+    stores = sorted(set().union(*options))
+
+    best = None
+    for store_set in _store_sets(stores, max_stores):
+        total, plan = 0.0, []
+        for opts in options:
+            choice = min(
+                ((opts[s][0], s) for s in store_set if s in opts), default=None
+            )
+            if choice is None:
+                break
+            total += choice[0]
+            plan.append(choice[1])
+        else:
+            if best is None or total < best[0]:
+                best = (total, plan)
+
+    if best is None:
+        return None
+
+    total, plan = best
+    assignment = [
+        {
+            "item": item,
+            "store": store,
+            "cost": opts[store][0],
+            "offer": opts[store][1],
+        }
+        for item, opts, store in zip(items, options, plan)
+    ]
+    return {
+        "total": round(total, 2),
+        "current_total": round(current_total, 2),
+        "saving": round(current_total - total, 2),
+        "stores": sorted(set(plan)),
+        "assignment": assignment,
+    }
@@ -0,0 +1,145 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any
+
+from config.settings import DATA_DIR
+from services.product_index import store_of
+from services.search_index import index_catalog_entries
+from utils.helpers import calculate_unit_price, get_product_id
+
+CATALOG_FILE = os.path.join(DATA_DIR, "catalog.sqlite")
+
+# One row per product id; UNIQUE(name, store) makes a price change replace the
+# old row, so the catalog only ever holds the latest offer of each product
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    store TEXT NOT NULL,
+    price REAL NOT NULL,
+    unit TEXT,
+    unit_price REAL,
+    base_unit TEXT,
+    valid_from TEXT,
+    valid_until TEXT,
+    image_url TEXT,
+    raw TEXT,
+    updated_at TEXT NOT NULL,
+    UNIQUE (name, store)
+)
+"""
+
+_write_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(CATALOG_FILE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(SCHEMA)
+    return conn
+
+
+def _row(product: dict[str, Any], updated_at: str) -> tuple | None:
+    try:
+        price = float(product.get("price_eur") or product.get("price", 0))
+        unit = product.get("quantity") or product.get("unit")
+        unit_price, base_unit = calculate_unit_price(price, unit)
+        brochure = product.get("brochure")
+        brochure = brochure if isinstance(brochure, dict) else {}
+        return (
+            get_product_id(product),
+            product.get("name", ""),
+            store_of(product),
+            price,
+            unit,
+            unit_price,
+            base_unit,
+            brochure.get("valid_from"),
+            brochure.get("valid_until"),
+            product.get("image_url") or product.get("image"),
+            json.dumps(product, ensure_ascii=False),
+            updated_at,
+        )
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def upsert_products(products: list[dict[str, Any]]) -> int:
+    """Writes the latest offer of each product; returns the rows written."""
+    updated_at = datetime.now().isoformat()
+    rows = [r for r in (_row(p, updated_at) for p in products or []) if r]
+    if not rows:
+        return 0
+    try:
+        with _write_lock:
+            conn = _connect()
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO products VALUES "
+                        "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+            finally:
+                conn.close()
+        index_catalog_entries(
+            {
+                "id": r[0],
+                "name": r[1],
+                "store": r[2],
+                "valid_until": r[8],
+                "updated_at": r[11],
+            }
+            for r in rows
+        )
+        return len(rows)
+    except sqlite3.Error as e:
+        print(f"Catalog Write Error: {e}")
+        return 0
+
+
+def load_index_entries() -> list[dict[str, Any]]:
+    """Flattened rows for the product index, without decoding the raw JSON."""
+    if not os.path.exists(CATALOG_FILE):
+        return []
+    try:
+        conn = _connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT id, name, store, price, unit, unit_price, base_unit, "
+                "valid_until, updated_at FROM products"
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+    except sqlite3.Error as e:
+        print(f"Catalog Read Error: {e}")
+        return []
+
+
+def get_products(product_ids: list[str]) -> list[dict[str, Any]]:
+    """Full product dicts (as returned by the API) for the ids, in that order."""
+    ids = list(dict.fromkeys(product_ids))
+    if not ids or not os.path.exists(CATALOG_FILE):
+        return []
+    try:
+        conn = _connect()
+        try:
+            placeholders = ",".join("?" * len(ids))
+            found = {
+                pid: json.loads(raw)
+                for pid, raw in conn.execute(
+                    f"SELECT id, raw FROM products WHERE id IN ({placeholders})", ids
+                )
+            }
+        finally:
+            conn.close()
+        return [found[pid] for pid in ids if pid in found]
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Catalog Read Error: {e}")
+        return []
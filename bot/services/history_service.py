@@ -1,11 +1,11 @@
-from api.supermarket import get_product_price
+from api.supermarket import get_product_price_sync
 from db.repositories.history_repo import get_product_history
 
 
 def get_combined_price_history(product_id: str, product_name: str, store: str):
     """Combines API history with internal database history records."""
     db_records = get_product_history(product_id)
-    api_results = get_product_price(product_name, multiple=True) or []
+    api_results = get_product_price_sync(product_name, multiple=True) or []
 
     api_match = next(
         (
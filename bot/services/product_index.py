@@ -0,0 +1,177 @@
+import re
+import threading
+from collections import Counter
+from typing import Any
+
+from utils.helpers import calculate_unit_price, get_product_id
+
+_TOKEN_RE = re.compile(r"\w+")
+CANDIDATE_CACHE_SIZE = 4096
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased word tokens of a product name (Latin and Cyrillic)."""
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+# Brand and store names that say nothing about what the product is
+IGNORE_WORDS = {
+    "pilos",
+    "саяна",
+    "lidl",
+    "kaufland",
+    "billa",
+    "боженци",
+    "vereia",
+    "верея",
+}
+
+
+def get_keywords(product_name: str) -> list[str]:
+    """Tokens used to find comparable products: no brands, no short words."""
+    return [w for w in tokenize(product_name) if w not in IGNORE_WORDS and len(w) > 2]
+
+
+def store_of(product: dict[str, Any]) -> str:
+    supermarket = product.get("supermarket")
+    if isinstance(supermarket, dict):
+        return supermarket.get("name") or product.get("store", "Unknown")
+    return product.get("store", "Unknown")
+
+
+def _make_entry(product: dict[str, Any]) -> dict[str, Any] | None:
+    """Flattens a cached product and precomputes its unit price."""
+    try:
+        price = float(product.get("price_eur") or product.get("price", 0))
+        unit = product.get("quantity") or product.get("unit")
+        unit_price, base_unit = calculate_unit_price(price, unit)
+        return {
+            "id": get_product_id(product),
+            "name": product.get("name", ""),
+            "price": price,
+            "unit": unit,
+            "store": store_of(product),
+            "unit_price": unit_price,
+            "base_unit": base_unit,
+        }
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+class ProductIndex:
+    """
+    In-memory inverted index over every product seen in search_cache.
+    Maps name tokens to product ids so lookups touch only the postings of
+    the query's keywords instead of scanning the whole cache.
+    """
+
+    def __init__(self):
+        self._products: dict[str, dict[str, Any]] = {}
+        self._postings: dict[str, set[str]] = {}
+        self._by_key: dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        # Memoized match results per keyword set, dropped whenever data changes
+        self._candidates: dict[tuple, tuple] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def add_products(self, products: list[dict[str, Any]]) -> int:
+        """Indexes (or re-indexes) products; returns how many were accepted."""
+        return self.add_entries(_make_entry(p) for p in products or [])
+
+    def _remove(self, product_id: str) -> None:
+        entry = self._products.pop(product_id, None)
+        if entry is None:
+            return
+        for token in set(tokenize(entry["name"])):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.discard(product_id)
+                if not postings:
+                    del self._postings[token]
+        key = (entry["name"], entry["store"])
+        if self._by_key.get(key) == product_id:
+            del self._by_key[key]
+
+    def add_entries(self, entries) -> int:
+        """
+        Indexes already flattened entries, e.g. rows of the local catalog.
+        One entry per (name, store): a new id for the same product replaces
+        the old one, as in the catalog.
+        """
+        added = 0
+        with self._lock:
+            for entry in entries:
+                if entry is None:
+                    continue
+                key = (entry["name"], entry["store"])
+                self._remove(entry["id"])
+                if key in self._by_key:
+                    self._remove(self._by_key[key])
+                self._products[entry["id"]] = entry
+                self._by_key[key] = entry["id"]
+                for token in set(tokenize(entry["name"])):
+                    self._postings.setdefault(token, set()).add(entry["id"])
+                added += 1
+            if added:
+                self._candidates.clear()
+        return added
+
+    def get_entries(self, product_ids: list[str]) -> list[dict[str, Any]]:
+        """Indexed entries for the ids, in that order; unknown ids are skipped."""
+        with self._lock:
+            return [self._products[pid] for pid in product_ids if pid in self._products]
+
+    def match(self, keywords: list[str], min_hits: int = 2) -> list[dict[str, Any]]:
+        """Products whose names contain at least `min_hits` of the keywords."""
+        hits = Counter()
+        with self._lock:
+            for token in set(keywords):
+                hits.update(self._postings.get(token, ()))
+            return [
+                self._products[pid] for pid, count in hits.items() if count >= min_hits
+            ]
+
+    def candidates(self, keywords: list[str], min_hits: int = 2) -> tuple:
+        """Memoized `match`: repeated cart items reuse their candidate set."""
+        key = (tuple(sorted(set(keywords))), min_hits)
+        cached = self._candidates.get(key)
+        if cached is None:
+            cached = tuple(self.match(keywords, min_hits))
+            if len(self._candidates) >= CANDIDATE_CACHE_SIZE:
+                self._candidates.clear()
+            self._candidates[key] = cached
+        return cached
+
+
+_index = ProductIndex()
+_load_lock = threading.Lock()
+
+
+def get_product_index() -> ProductIndex:
+    """
+    Returns the shared index, building it on first use from the local catalog
+    and the search_cache table. The catalog rows also seed the search index.
+    """
+    if not _index.loaded:
+        with _load_lock:
+            if not _index.loaded:
+                from db.repositories.cache_repo import get_all_cached_products
+                from services.catalog import load_index_entries
+                from services.search_index import index_catalog_entries
+
+                entries = load_index_entries()
+                _index.add_entries(entries)
+                index_catalog_entries(entries)
+                for products in get_all_cached_products():
+                    _index.add_products(products)
+                _index.loaded = True
+                print(f"🗂 Product index built with {len(_index)} products")
+    return _index
+
+
+def index_products(products: list[dict[str, Any]]) -> None:
+    """Incremental update hook for newly cached search results."""
+    _index.add_products(products)
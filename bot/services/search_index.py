@@ -0,0 +1,335 @@
+import bisect
+import math
+import re
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any
+
+# Bulgarian streamlined transliteration: "мляко" and "mlyako" fold to the same
+# term, so users can type in either script
+_TRANSLIT = str.maketrans(
+    {
+        "а": "a",
+        "б": "b",
+        "в": "v",
+        "г": "g",
+        "д": "d",
+        "е": "e",
+        "ж": "zh",
+        "з": "z",
+        "и": "i",
+        "й": "y",
+        "к": "k",
+        "л": "l",
+        "м": "m",
+        "н": "n",
+        "о": "o",
+        "п": "p",
+        "р": "r",
+        "с": "s",
+        "т": "t",
+        "у": "u",
+        "ф": "f",
+        "х": "h",
+        "ц": "ts",
+        "ч": "ch",
+        "ш": "sh",
+        "щ": "sht",
+        "ъ": "a",
+        "ь": "y",
+        "ю": "yu",
+        "я": "ya",
+        "w": "v",
+    }
+)
+# "1 l", "1л" and "1lt" all fold to the term "1l", so quantities stay whole
+_QUANTITY_RE = re.compile(
+    r"(\d+(?:[.,]\d+)?)\s*(kg|gr|g|ml|cl|lt|l|pcs|pc|broya|br)(?![a-z])"
+)
+_UNIT_ALIASES = {"gr": "g", "lt": "l", "pcs": "pc", "broya": "pc", "br": "pc"}
+_TERM_RE = re.compile(r"\d+(?:\.\d+)?[a-z]+|[a-z]+|\d+")
+_DIGIT_RE = re.compile(r"\d")
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+MIN_SIMILARITY = 0.5  # trigram Dice score for a term to count as a typo match
+PREFIX_WEIGHT = 0.9  # "mlya" -> "mlyako" scores a little below an exact hit
+MAX_EXPANSIONS = 20  # index terms tried per query term
+
+# A local answer replaces the API call only when it is clearly good: every
+# query term matched exactly (or by a prefix of MIN_CONFIDENT_PREFIX chars),
+# a minimum BM25 score per term, and either MIN_CONFIDENT_RESULTS such
+# products or a SPECIFIC_QUERY_TERMS-term query naming one product exactly
+MIN_CONFIDENT_PREFIX = 4
+MIN_CONFIDENT_SCORE = 1.0
+MIN_CONFIDENT_RESULTS = 3
+SPECIFIC_QUERY_TERMS = 3
+# Rows the bulk crawl (Mon/Wed) has not refreshed within its longest gap plus
+# a day have left the API; they are no longer served
+CATALOG_MAX_AGE = timedelta(days=6)
+
+
+def fold(text: str) -> str:
+    """Lower-cases and transliterates Cyrillic to Latin."""
+    return str(text).lower().translate(_TRANSLIT)
+
+
+def _quantity(match: re.Match) -> str:
+    unit = match.group(2)
+    return match.group(1).replace(",", ".") + _UNIT_ALIASES.get(unit, unit)
+
+
+def terms(text: str) -> list[str]:
+    return _TERM_RE.findall(_QUANTITY_RE.sub(_quantity, fold(text)))
+
+
+def _trigrams(term: str) -> set[str]:
+    padded = f" {term} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    BM25 index over product names with a trigram index over its vocabulary.
+    Query terms are expanded to exact, prefix and near-miss (typo) index
+    terms before scoring, all in memory.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._doc_ids: list[str | None] = []
+        self._doc_terms: list[Counter] = []
+        self._doc_length: list[int] = []
+        self._doc_valid_until: list[str | None] = []
+        self._doc_updated_at: list[str | None] = []
+        self._by_key: dict[tuple, int] = {}
+        self._by_id: dict[str, int] = {}
+        self._postings: dict[str, dict[int, int]] = {}
+        self._term_trigrams: dict[str, set[str]] = {}
+        self._vocabulary: list[str] = []
+        # Slots of replaced documents, reused so the lists do not keep growing
+        self._free: list[int] = []
+        self._total_length = 0
+        self._live = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def _remove(self, doc: int) -> None:
+        for term in self._doc_terms[doc]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc, None)
+                if not postings:
+                    self._drop_term(term)
+        self._total_length -= self._doc_length[doc]
+        self._by_id.pop(self._doc_ids[doc], None)
+        self._doc_ids[doc] = None
+        self._doc_terms[doc] = Counter()
+        self._doc_length[doc] = 0
+        self._doc_valid_until[doc] = None
+        self._doc_updated_at[doc] = None
+        self._free.append(doc)
+        self._live -= 1
+
+    def _add_term(self, term: str) -> None:
+        bisect.insort(self._vocabulary, term)
+        for gram in _trigrams(term):
+            self._term_trigrams.setdefault(gram, set()).add(term)
+
+    def _drop_term(self, term: str) -> None:
+        del self._postings[term]
+        i = bisect.bisect_left(self._vocabulary, term)
+        if i < len(self._vocabulary) and self._vocabulary[i] == term:
+            del self._vocabulary[i]
+        for gram in _trigrams(term):
+            grams = self._term_trigrams.get(gram)
+            if grams is not None:
+                grams.discard(term)
+                if not grams:
+                    del self._term_trigrams[gram]
+
+    def add_entries(self, entries) -> int:
+        """
+        Indexes catalog entries (id, name, store, valid_until, updated_at).
+        A new id for the same name and store replaces the old document, like
+        the catalog; a known id only has its dates refreshed.
+        """
+        added = 0
+        with self._lock:
+            for entry in entries:
+                if entry["id"] in self._by_id:
+                    doc = self._by_id[entry["id"]]
+                    self._doc_valid_until[doc] = entry.get("valid_until")
+                    self._doc_updated_at[doc] = entry.get("updated_at")
+                    continue
+                key = (entry["name"], entry["store"])
+                if key in self._by_key:
+                    self._remove(self._by_key[key])
+
+                counts = Counter(terms(entry["name"]))
+                if self._free:
+                    doc = self._free.pop()
+                else:
+                    doc = len(self._doc_ids)
+                    self._doc_ids.append(None)
+                    self._doc_terms.append(Counter())
+                    self._doc_length.append(0)
+                    self._doc_valid_until.append(None)
+                    self._doc_updated_at.append(None)
+                self._doc_ids[doc] = entry["id"]
+                self._doc_terms[doc] = counts
+                self._doc_length[doc] = sum(counts.values())
+                self._doc_valid_until[doc] = entry.get("valid_until")
+                self._doc_updated_at[doc] = entry.get("updated_at")
+                self._by_key[key] = doc
+                self._by_id[entry["id"]] = doc
+                for term, tf in counts.items():
+                    if term not in self._postings:
+                        self._postings[term] = {}
+                        self._add_term(term)
+                    self._postings[term][doc] = tf
+                self._total_length += self._doc_length[doc]
+                self._live += 1
+                added += 1
+        return added
+
+    def _expand(self, term: str) -> dict[str, float]:
+        """Index terms a query term may mean, with a weight in (0, 1]."""
+        matches = {}
+        if term in self._postings:
+            matches[term] = 1.0
+
+        # Prefix matches: contiguous run of the sorted vocabulary
+        if len(term) >= 3:
+            start = bisect.bisect_left(self._vocabulary, term)
+            for candidate in self._vocabulary[start : start + MAX_EXPANSIONS]:
+                if not candidate.startswith(term):
+                    break
+                matches.setdefault(candidate, PREFIX_WEIGHT)
+
+        # Typo tolerance: terms sharing enough trigrams; numbers and
+        # quantities must match exactly ("500g" is not a typo of "200g")
+        if not _DIGIT_RE.search(term) and len(term) >= 4:
+            grams = _trigrams(term)
+            shared = Counter()
+            for gram in grams:
+                shared.update(self._term_trigrams.get(gram, ()))
+            for candidate, common in shared.most_common(MAX_EXPANSIONS * 5):
+                dice = 2 * common / (len(grams) + len(candidate))
+                if dice >= MIN_SIMILARITY and candidate not in matches:
+                    matches[candidate] = dice
+
+        best = sorted(matches.items(), key=lambda m: -m[1])[:MAX_EXPANSIONS]
+        return dict(best)
+
+    def search(
+        self, query: str, limit: int = 10, max_age: timedelta = CATALOG_MAX_AGE
+    ) -> tuple[list[str], bool]:
+        """
+        Returns (product ids ranked by BM25, confident). Typo matches help
+        ranking but never make a search confident (see MIN_CONFIDENT_*); a
+        confident search returns only the products that passed. Expired
+        offers and rows older than `max_age` are left out.
+        """
+        query_terms = [t for t in dict.fromkeys(terms(query)) if len(t) > 1]
+        if not query_terms:
+            return [], False
+
+        today = date.today().isoformat()
+        fresh_after = (datetime.now() - max_age).isoformat()
+        with self._lock:
+            if not self._live:
+                return [], False
+            avg_length = self._total_length / self._live
+            scores: Counter = Counter()
+            coverage: Counter = Counter()
+            # Query terms matched exactly / exactly or by a long enough prefix
+            exact: Counter = Counter()
+            strict: Counter = Counter()
+
+            for term in query_terms:
+                matched_docs = {}
+                exact_docs, strict_docs = set(), set()
+                for candidate, weight in self._expand(term).items():
+                    postings = self._postings[candidate]
+                    is_strict = candidate == term or (
+                        len(term) >= MIN_CONFIDENT_PREFIX and candidate.startswith(term)
+                    )
+                    idf = math.log(
+                        1 + (self._live - len(postings) + 0.5) / (len(postings) + 0.5)
+                    )
+                    for doc, tf in postings.items():
+                        length = self._doc_length[doc]
+                        norm = tf + K1 * (1 - B + B * length / avg_length)
+                        score = weight * idf * tf * (K1 + 1) / norm
+                        # A document counts its best reading of each query term
+                        if score > matched_docs.get(doc, 0.0):
+                            matched_docs[doc] = score
+                        if is_strict:
+                            strict_docs.add(doc)
+                            if candidate == term:
+                                exact_docs.add(doc)
+                for doc, score in matched_docs.items():
+                    scores[doc] += score
+                    coverage[doc] += 1
+                exact.update(exact_docs)
+                strict.update(strict_docs)
+
+            ranked = sorted(
+                (
+                    doc
+                    for doc in scores
+                    if (self._doc_valid_until[doc] or today) >= today
+                    and (self._doc_updated_at[doc] or fresh_after) >= fresh_after
+                ),
+                key=lambda doc: (-strict[doc], -coverage[doc], -scores[doc]),
+            )
+
+            min_score = MIN_CONFIDENT_SCORE * len(query_terms)
+            passed = [
+                doc
+                for doc in ranked
+                if strict[doc] == len(query_terms) and scores[doc] >= min_score
+            ][:limit]
+            specific = (
+                len(query_terms) >= SPECIFIC_QUERY_TERMS
+                and bool(passed)
+                and exact[passed[0]] == len(query_terms)
+            )
+            confident = specific or len(passed) >= min(MIN_CONFIDENT_RESULTS, limit)
+            ids = [
+                self._doc_ids[doc] for doc in (passed if confident else ranked[:limit])
+            ]
+        return ids, confident
+
+
+_index = SearchIndex()
+
+
+def get_search_index() -> SearchIndex:
+    return _index
+
+
+def index_catalog_entries(entries) -> int:
+    """Adds catalog rows to the shared search index."""
+    return _index.add_entries(entries)
+
+
+def search_products(
+    query: str, limit: int = 10, max_age: timedelta = CATALOG_MAX_AGE
+) -> list[dict[str, Any]]:
+    """
+    Products for `query` from the local catalog, best first. Returns an empty
+    list unless the index has a confident match, so callers fall back to the
+    API for everything else.
+    """
+    from services.catalog import get_products
+
+    ids, confident = _index.search(query, limit, max_age)
+    if not confident:
+        return []
+    return get_products(ids)
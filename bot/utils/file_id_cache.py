@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+
+from telegram import Message
+from telegram.error import BadRequest
+
+from config.settings import DATA_DIR
+
+# image_url -> Telegram file_id, so a product photo is uploaded from the
+# supermarket CDN once and afterwards resent by reference
+FILE_ID_CACHE_FILE = os.path.join(DATA_DIR, "file_ids.json")
+FILE_ID_CACHE_SIZE = 5000
+SAVE_DELAY = 30  # seconds; new ids are written in batches
+
+_file_ids: OrderedDict[str, str] | None = None
+_save_task: asyncio.Task | None = None
+
+
+def _load() -> OrderedDict:
+    global _file_ids
+    if _file_ids is None:
+        _file_ids = OrderedDict()
+        try:
+            with open(FILE_ID_CACHE_FILE, encoding="utf-8") as f:
+                _file_ids.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"File ID Cache Read Error: {e}")
+    return _file_ids
+
+
+def save_file_ids():
+    """Writes the map to DATA_DIR (write-then-rename)."""
+    if _file_ids is None:
+        return
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp_path = f"{FILE_ID_CACHE_FILE}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_file_ids, f)
+        os.replace(tmp_path, FILE_ID_CACHE_FILE)
+    except OSError as e:
+        print(f"File ID Cache Write Error: {e}")
+
+
+async def _save_later():
+    await asyncio.sleep(SAVE_DELAY)
+    await asyncio.to_thread(save_file_ids)
+
+
+def _schedule_save():
+    global _save_task
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        save_file_ids()
+        return
+    if _save_task is None or _save_task.done():
+        _save_task = loop.create_task(_save_later())
+
+
+def get_file_id(image_url: str) -> str | None:
+    file_ids = _load()
+    file_id = file_ids.get(image_url)
+    if file_id is not None:
+        file_ids.move_to_end(image_url)
+    return file_id
+
+
+def remember_photo(image_url: str, message) -> None:
+    """Stores the file_id of the largest size of a photo we just sent."""
+    if not isinstance(message, Message) or not message.photo:
+        return
+    file_ids = _load()
+    file_id = message.photo[-1].file_id
+    if file_ids.get(image_url) == file_id:
+        return
+    file_ids[image_url] = file_id
+    file_ids.move_to_end(image_url)
+    while len(file_ids) > FILE_ID_CACHE_SIZE:
+        file_ids.popitem(last=False)
+    _schedule_save()
+
+
+def forget_file_id(image_url: str) -> None:
+    if _load().pop(image_url, None) is not None:
+        _schedule_save()
+
+
+async def send_cached_photo(image_url: str, send):
+    """
+    Calls `send(photo)` with the cached file_id when there is one, falling
+    back to the URL if Telegram rejects it, and caches the resulting file_id.
+    `send` is e.g. `lambda photo: message.reply_photo(photo, caption=...)`.
+    """
+    file_id = get_file_id(image_url)
+    if file_id is not None:
+        try:
+            return await send(file_id)
+        except BadRequest as e:
+            print(f"Cached file_id rejected, resending by URL: {e}")
+            forget_file_id(image_url)
+
+    message = await send(image_url)
+    remember_photo(image_url, message)
+    return message
@@ -1,8 +1,8 @@
 import hashlib
-import re
 from datetime import datetime
 
 from db.repositories.user_repo import is_user_premium
+from utils.unit_parser import parse_quantity
 
 
 def get_product_id(product: dict) -> str:
@@ -15,41 +15,22 @@ def get_product_id(product: dict) -> str:
 
 def calculate_unit_price(price, unit_str):
     """
-    Parses unit strings like '1.5 L', '500 g', '1kg' and returns price per 1L or 1kg.
-    Supports both Latin and Cyrillic units.
+    Parses unit strings like '1.5 L', '500 g', '6 x 330 ml', '10 бр' and returns
+    the price per 1 kg, 1 l or 1 piece. Unknown units give (None, None).
     """
     if not unit_str or price is None:
         return None, None
 
-    # Regex to extract numeric value and the unit label
-    # Matches '500g', '500 g', '1.5L', etc.
-    match = re.search(r"(\d+[\.,]?\d*)\s*([a-zA-Zа-яА-Я]+)", str(unit_str).lower())
-    if not match:
+    parsed = parse_quantity(str(unit_str))
+    if parsed is None:
         return None, None
 
+    amount, base_unit = parsed
     try:
-        value = float(match.group(1).replace(",", "."))
-        unit = match.group(2)
-    except (ValueError, IndexError):
+        return round(float(price) / amount, 2), base_unit
+    except (ValueError, TypeError):
         return None, None
 
-    # Normalization mapping
-    # Weight: g, гр, г -> kg
-    # Volume: ml, мл -> l
-    weight_units = ["g", "гр", "г", "kg", "кг"]
-
-    base_unit = "kg" if unit in weight_units else "l"
-    norm_value = value
-
-    # Convert grams/milliliters to base (kg/l)
-    if unit in ["g", "гр", "г", "ml", "мл"]:
-        norm_value = value / 1000
-
-    if norm_value > 0:
-        return round(price / norm_value, 2), base_unit
-
-    return None, None
-
 
 def format_promo_dates(product: dict) -> str:
     """Extracts valid_until from product['brochure'] and formats it."""
@@ -75,5 +56,30 @@ def format_promo_dates(product: dict) -> str:
         return f"⏳ until {until_date}"
 
 
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def split_message(
+    header: str, blocks: list[str], limit: int = TELEGRAM_MESSAGE_LIMIT
+) -> list[str]:
+    """
+    Joins blocks under a header into as few messages as fit Telegram's limit.
+    Blocks are never split across messages; every part starts with the header.
+    """
+    parts, current = [], []
+    size = len(header)
+    for block in blocks:
+        extra = len(block) + (2 if current else 0)
+        if current and size + extra > limit:
+            parts.append(header + "\n\n".join(current))
+            current, size, extra = [], len(header), len(block)
+        current.append(block)
+        size += extra
+    if current:
+        parts.append(header + "\n\n".join(current))
+    # A single oversized block is truncated rather than rejected by Telegram
+    return [part[:limit] for part in parts]
+
+
 def get_user_badge(user_id: int) -> str:
     return "💎 Premium Member" if is_user_premium(user_id) else "👤 Free Member"
@@ -1,21 +1,94 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
 from db.supabase_client import supabase
 
+# Recent ids per user live in memory; Supabase is only the durable copy used
+# after a restart or when a user has more ids than the ring holds
+RING_SIZE = 200
+DELETE_WINDOW = 48 * 3600  # Telegram refuses to delete older bot messages
 
-def add_message(user_id: int, message_id: int):
+_rings: dict[int, deque] = {}
+_overflowed: set[int] = set()
+# Users whose stored ids were merged in this process; a ring alone may only
+# hold ids added since the last restart
+_loaded: set[int] = set()
+
+# Write-behind buffer: ids are inserted in bulk instead of one request each
+FLUSH_INTERVAL = 0.5  # seconds
+FLUSH_MAX_ROWS = 100
+
+_pending: list[dict] = []
+_flush_task: asyncio.Task | None = None
+_flush_lock = asyncio.Lock()
+
+
+def _insert_rows(rows: list[dict]):
     try:
-        supabase.table("message_cache").insert(
-            {"user_id": user_id, "message_id": message_id}
-        ).execute()
+        supabase.table("message_cache").insert(rows).execute()
     except Exception as e:
-        print(f"Error adding message to cache: {e}")
+        print(f"Error adding messages to cache: {e}")
+
+
+async def _flush_later():
+    await asyncio.sleep(FLUSH_INTERVAL)
+    await flush_messages()
 
 
-def get_messages(user_id: int):
+async def flush_messages():
+    """Writes all buffered ids in one insert. Safe to call at any time."""
+    async with _flush_lock:
+        if not _pending:
+            return
+        rows = _pending[:]
+        _pending.clear()
+        await asyncio.to_thread(_insert_rows, rows)
+
+
+def _remember(user_id: int, message_id: int):
+    ring = _rings.setdefault(user_id, deque(maxlen=RING_SIZE))
+    if len(ring) == RING_SIZE:
+        _overflowed.add(user_id)
+    ring.append((message_id, time.time()))
+
+
+def add_message(user_id: int, message_id: int):
+    """
+    Records the id in the user's ring and buffers it for Supabase;
+    the buffer is flushed after FLUSH_INTERVAL or FLUSH_MAX_ROWS.
+    """
+    global _flush_task
+    _remember(user_id, message_id)
+    row = {"user_id": user_id, "message_id": message_id}
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Called outside the bot's loop: nothing would flush, insert directly
+        _insert_rows([row])
+        return
+
+    _pending.append(row)
+    if len(_pending) >= FLUSH_MAX_ROWS:
+        loop.create_task(flush_messages())
+    elif _flush_task is None or _flush_task.done():
+        _flush_task = loop.create_task(_flush_later())
+
+
+def _cutoff_iso() -> str:
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=DELETE_WINDOW)
+    return cutoff.isoformat()
+
+
+def _fetch_stored(user_id: int) -> list[int]:
     try:
         response = (
             supabase.table("message_cache")
             .select("message_id")
             .eq("user_id", user_id)
+            .gte("created_at", _cutoff_iso())
             .execute()
         )
         return [row["message_id"] for row in response.data]
@@ -24,8 +97,59 @@ def get_messages(user_id: int):
         return []
 
 
-def clear_messages(user_id: int):
+def _delete_stored(user_id: int):
     try:
         supabase.table("message_cache").delete().eq("user_id", user_id).execute()
     except Exception as e:
         print(f"Error clearing message cache: {e}")
+
+
+async def get_messages(user_id: int) -> list[int]:
+    """
+    Returns ids that can still be deleted (younger than 48h).
+    Served from memory; Supabase is read on the first call per user in this
+    process and whenever the ring has overflowed.
+    """
+    cutoff = time.time() - DELETE_WINDOW
+    ring = _rings.get(user_id)
+    ids = []
+    if ring is not None:
+        while ring and ring[0][1] < cutoff:
+            ring.popleft()
+        ids = [message_id for message_id, _ in ring]
+
+    if user_id not in _loaded or user_id in _overflowed:
+        await flush_messages()
+        stored = await asyncio.to_thread(_fetch_stored, user_id)
+        ids = list(dict.fromkeys(stored + ids))
+        _loaded.add(user_id)
+    return ids
+
+
+async def clear_messages(user_id: int):
+    """Forgets all ids of a user, including ones still waiting to be flushed."""
+    _rings[user_id] = deque(maxlen=RING_SIZE)
+    _overflowed.discard(user_id)
+    async with _flush_lock:
+        _pending[:] = [row for row in _pending if row["user_id"] != user_id]
+        await asyncio.to_thread(_delete_stored, user_id)
+    # Nothing is stored any more, so the (empty) ring is now complete
+    _loaded.add(user_id)
+
+
+def _delete_expired():
+    try:
+        supabase.table("message_cache").delete().lt(
+            "created_at", _cutoff_iso()
+        ).execute()
+    except Exception as e:
+        print(f"Error pruning message cache: {e}")
+
+
+async def prune_expired_messages():
+    """Drops ids Telegram no longer lets us delete, in memory and in Supabase."""
+    cutoff = time.time() - DELETE_WINDOW
+    for ring in _rings.values():
+        while ring and ring[0][1] < cutoff:
+            ring.popleft()
+    await asyncio.to_thread(_delete_expired)
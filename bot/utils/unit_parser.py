@@ -0,0 +1,40 @@
+import re
+from functools import lru_cache
+
+# "500 g", "1,5л", "6 x 1.5 L", "2х250 мл", "10 бр"; the multiplier is optional
+QUANTITY_RE = re.compile(
+    r"(?:(\d+)\s*[xх×*]\s*)?(\d+(?:[.,]\d+)?)\s*([a-zа-я]+)", re.IGNORECASE
+)
+
+# unit label -> (base unit, factor to the base unit)
+UNITS = {
+    **dict.fromkeys({"g", "gr", "г", "гр"}, ("kg", 0.001)),
+    **dict.fromkeys({"kg", "кг"}, ("kg", 1.0)),
+    **dict.fromkeys({"ml", "мл"}, ("l", 0.001)),
+    **dict.fromkeys({"cl"}, ("l", 0.01)),
+    **dict.fromkeys({"l", "lt", "л"}, ("l", 1.0)),
+    **dict.fromkeys({"pc", "pcs", "br", "бр", "броя"}, ("pc", 1.0)),
+}
+
+
+@lru_cache(maxsize=2048)
+def parse_quantity(unit_str: str) -> tuple[float, str] | None:
+    """
+    Parses a quantity label into (amount in base units, base unit), where the
+    base unit is "kg", "l" or "pc". Returns None for unknown or zero amounts.
+    Cached: shops reuse a small set of labels across thousands of products.
+    """
+    match = QUANTITY_RE.search(unit_str)
+    if not match:
+        return None
+
+    count, value, label = match.groups()
+    unit = UNITS.get(label.lower())
+    if unit is None:
+        return None
+
+    base_unit, factor = unit
+    amount = float(value.replace(",", ".")) * factor * int(count or 1)
+    if amount <= 0:
+        return None
+    return amount, base_unit